@@ -2,6 +2,8 @@ from fastapi import FastAPI
 from pydantic import BaseModel
 from dotenv import load_dotenv
 import os
+import re
+import sys
 import json
 
 # 1. Import the CORS middleware
@@ -12,9 +14,14 @@ from langchain.prompts import ChatPromptTemplate
 from langchain.schema.runnable import RunnablePassthrough
 from langchain.schema.output_parser import StrOutputParser
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from shared.observability import get_logger, instrument_fastapi, stage_timer
+
 load_dotenv()
+log = get_logger("chatbot")
 
 app = FastAPI()
+instrument_fastapi(app)
 
 # 2. Define the frontend origins that are allowed to connect
 origins = [
@@ -54,17 +61,68 @@ chain = (
 
 with open("citizen_services_geo.json", "r") as f:
     department_data = json.load(f)
-    
+
+# Words in department names that don't identify one ("Fire Department" -> "fire")
+GENERIC_WORDS = {"department", "dept", "office", "and", "of", "the"}
+
+
+def normalize_term(word: str) -> str:
+    """Lower-case and drop a plural 's', so "Roads" and "road" are the same term."""
+    word = word.lower()
+    return word[:-1] if len(word) > 3 and word.endswith("s") else word
+
+
+def build_index(records):
+    """
+    Groups records as location key -> department key -> [records], keys lower-cased
+    once here. Also returns the display name of each location and the terms a
+    user might type for each department ("Roads / PWD" -> "road", "pwd").
+    """
+    index, location_names, department_terms = {}, {}, {}
+    for record in records:
+        location = record["location"].strip()
+        department = record["department"].strip().lower()
+        index.setdefault(location.lower(), {}).setdefault(department, []).append(record)
+        location_names.setdefault(location.lower(), location)
+        for word in re.findall(r"[a-z]+", department):
+            if word not in GENERIC_WORDS:
+                department_terms.setdefault(normalize_term(word), set()).add(department)
+    return index, location_names, department_terms
+
+
+def compile_matcher(terms):
+    """
+    One regex matching any of `terms` at a word start, longest first so
+    "andheri east" wins over "andheri". Multi-word terms match any whitespace.
+    """
+    ordered = sorted(terms, key=len, reverse=True)
+    alternation = "|".join(r"\s+".join(map(re.escape, term.split())) for term in ordered)
+    return re.compile(rf"\b(?:{alternation})", re.IGNORECASE)
+
+
+department_index, location_names, department_terms = build_index(department_data)
+location_matcher = compile_matcher(location_names)
+department_matcher = compile_matcher(department_terms)
+
+
+def extract_entities(query: str):
+    """First location key and first department term mentioned in the query, or None."""
+    location = location_matcher.search(query)
+    department = department_matcher.search(query)
+    return (
+        " ".join(location.group().lower().split()) if location else None,
+        normalize_term(department.group()) if department else None,
+    )
+
+
 def find_department(location: str, department: str = None):
-    results = []
-    for dept in department_data:
-        if location.lower() in dept["location"].lower():
-            if department:
-                if department.lower() in dept["department"].lower():
-                    results.append(dept)
-            else:
-                results.append(dept)
-    return results
+    """Records for a location, optionally narrowed to a department name or term."""
+    departments = department_index.get(location.strip().lower(), {})
+    if not department:
+        return [record for records in departments.values() for record in records]
+    key = department.strip().lower()
+    wanted = {key} if key in departments else department_terms.get(normalize_term(key), set())
+    return [record for name in wanted & departments.keys() for record in departments[name]]
 
 def format_results(results):
     if not results:
@@ -82,29 +140,20 @@ def format_results(results):
 @app.post("/chat")
 async def chat(request: ChatRequest):
     user_query = request.query.lower()
-    
-    departments = ["fire", "water", "road", "electricity", "pwd"]
-    locations = ["bandra", "andheri", "dadar", "borivali", "chembur"]
-    
-    matched_dept = None
-    for dept in departments:
-        if dept in user_query:
-            matched_dept = dept
-            break
-            
-    matched_loc = None
-    for loc in locations:
-        if loc in user_query:
-            matched_loc = loc
-            break
-    
+
+    with stage_timer("lookup"):
+        matched_loc, matched_dept = extract_entities(user_query)
+        results = find_department(matched_loc, matched_dept) if matched_loc else None
+
     if matched_loc:
-        results = find_department(matched_loc, matched_dept)
+        place = location_names[matched_loc]
         if results:
-            return {"reply": f"Here's what I found for {matched_loc.title()}:\n\n{format_results(results)}"}
+            return {"reply": f"Here's what I found for {place}:\n\n{format_results(results)}"}
         else:
-            return {"reply": f"Sorry, I couldn't find any department information for {matched_loc.title()}."}
+            return {"reply": f"Sorry, I couldn't find any department information for {place}."}
         
-    response = await chain.ainvoke(user_query)
+    log.debug("No location matched, asking the LLM", extra={"query": user_query})
+    with stage_timer("llm"):
+        response = await chain.ainvoke(user_query)
     return {"reply": response}
 
@@ -1,92 +1,344 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+import numpy as np
+import math
+import os
+import sys
+from issue_store import create_store
+from event_stream import EventBroadcaster
+from fleet import FleetTracker
 
+# shared/ lives one level up, next to the other services
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from shared.observability import REGISTRY, get_logger, stage_timer, instrument_flask
+
+log = get_logger('backend')
 app = Flask(__name__)
 CORS(app)
+# Request latency histograms per route, served at /metrics
+instrument_flask(app)
+
+# Push channel for dashboards: vehicle pings and issue create/resolve events
+events = EventBroadcaster()
+
+# --- Data Stores ---
+DEFAULT_VEHICLE_ID = "MH01-AV1234"
+fleet = FleetTracker()
+fleet.update(DEFAULT_VEHICLE_ID, 19.093344596650404, 73.01000000000000)
+# Issue store: in-memory by default, SQLite when ISSUE_STORE=sqlite (needed for multiple workers)
+store = create_store()
+# AI reports of the same issue_type closer than this are merged into one issue with a report_count
+DEDUP_RADIUS_METERS = float(os.getenv('DEDUP_RADIUS_METERS', 10))
+
+def _publish_issue_change(op, issue, seq):
+    if op == 'create':
+        events.publish('issue_created', issue, event_id=seq)
+    elif op == 'update':
+        events.publish('issue_updated', issue, event_id=seq)
+    else:
+        events.publish('issue_resolved', {'id': issue['id']}, event_id=seq)
+
+store.listeners.append(_publish_issue_change)
+
+REGISTRY.gauge('sse_subscribers', 'Open /stream connections', lambda: len(events))
+REGISTRY.gauge('issue_change_seq', 'Latest issue store change sequence number', lambda: store.seq)
 
-# --- In-memory Data Stores ---
-vehicle_locations = {"MH01-AV1234": {"lat": 19.093344596650404, "lon": 73.01000000000000}}
-# FIXED: Initialized issues dictionary and counter
-issues = {}
-issue_counter = 0
+def _conditional_json(build):
+    """Answers 304 when the client's ETag matches the current change seq, else jsonify(build())."""
+    etag = f"{store.epoch}-{store.seq}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def _finite_float(value):
+    """float(value), raising ValueError for NaN/inf, which the grid index can't place."""
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"not a finite number: {value!r}")
+    return number
 
 # --- SOS Alert Endpoints ---
 @app.route('/report_sos_issue', methods=['POST'])
 def report_sos_issue():
     """Receives alerts from physical SOS hardware boxes or simulators."""
-    global issue_counter
     data = request.json
-    
-    issue_counter += 1
-    issue_id = issue_counter
-    
-    new_issue = {
-        'id': issue_id,
-        'issue_type': data.get('issue_type', 'SOS Alert'),
-        'latitude': data.get('latitude'),
-        'longitude': data.get('longitude'),
-        'userName': data.get('userName', 'Unknown User'),
-        'address': data.get('address', 'Address not provided'),
-        'source': 'SOS Button'
-    }
-    issues[issue_id] = new_issue
-    print(f"✅ Received SOS Alert #{issue_id}: {new_issue['issue_type']}")
-    return jsonify({"status": "success", "issue_id": issue_id})
+    issue_type = data.get('issue_type')
+    if issue_type is None:
+        issue_type = 'SOS Alert'
+    if not isinstance(issue_type, str) or not issue_type:
+        return jsonify({"status": "error", "message": "issue_type must be a non-empty string."}), 400
+
+    with stage_timer('store_write'):
+        new_issue = store.add({
+            'issue_type': issue_type,
+            'latitude': data.get('latitude'),
+            'longitude': data.get('longitude'),
+            'userName': data.get('userName', 'Unknown User'),
+            'address': data.get('address', 'Address not provided'),
+            'source': 'SOS Button'
+        })
+    log.info("Received SOS alert", extra={'issue_id': new_issue['id'], 'issue_type': new_issue['issue_type']})
+    return jsonify({"status": "success", "issue_id": new_issue['id']})
 
 @app.route('/get_sos_alerts', methods=['GET'])
 def get_sos_alerts():
     """Provides active SOS alerts to the frontend map."""
-    sos_issues = [
-        issue for issue in issues.values() 
-        if issue.get('source') == 'SOS Button'
-    ]
-    return jsonify({"alerts": sos_issues})
+    return _conditional_json(lambda: {"alerts": store.by_source('SOS Button')})
 
 # --- Other Endpoints (Existing Logic) ---
 
+def _position(lat, lon):
+    """(lat, lon) as floats; ValueError for NaN/inf or out-of-range values, which would break JSON clients."""
+    lat, lon = float(lat), float(lon)
+    if not (abs(lat) <= 90 and abs(lon) <= 180):
+        raise ValueError(f"invalid position: lat={lat}, lon={lon}")
+    return lat, lon
+
+def _parse_ping(data):
+    """Turns a ping payload into a (vehicle_id, lat, lon, timestamp) tuple. Raises ValueError if invalid."""
+    timestamp = data.get('timestamp')
+    lat, lon = _position(data['lat'], data['lon'])
+    timestamp = None if timestamp is None else _finite_float(timestamp)
+    return str(data.get('vehicle_id', DEFAULT_VEHICLE_ID)), lat, lon, timestamp
+
 @app.route('/update_location', methods=['POST'])
 def update_location():
-    data = request.json
-    vehicle_locations["MH01-AV1234"] = {'lat': data['lat'], 'lon': data['lon']}
+    """Single GPS ping. vehicle_id defaults to the demo vehicle for older clients."""
+    try:
+        vehicle_id, lat, lon, timestamp = _parse_ping(request.json)
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"status": "error", "message": "lat and lon are required numbers within ±90 and ±180."}), 400
+    fleet.update(vehicle_id, lat, lon, timestamp)
+    events.publish('vehicle_location', {'vehicle_id': vehicle_id, 'lat': lat, 'lon': lon})
     return jsonify({"status": "location updated"})
 
+@app.route('/update_locations_bulk', methods=['POST'])
+def update_locations_bulk():
+    """Many pings in one request: {"pings": [{"vehicle_id", "lat", "lon", "timestamp"?}, ...]}."""
+    data = request.json
+    raw_pings = data.get('pings') if isinstance(data, dict) else data
+    # Every ping is parsed before any is applied, so one bad ping leaves the fleet untouched
+    try:
+        pings = [_parse_ping(ping) for ping in raw_pings]
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return jsonify({
+            "status": "error",
+            "message": "Expected a list of pings with vehicle_id and in-range lat and lon."
+        }), 400
+    fleet.update_many(pings)
+    events.publish('vehicle_locations', [
+        {'vehicle_id': vehicle_id, 'lat': lat, 'lon': lon} for vehicle_id, lat, lon, _ in pings
+    ])
+    return jsonify({"status": "locations updated", "count": len(pings)})
+
+@app.route('/stream', methods=['GET'])
+def stream_events():
+    """
+    Server-Sent Events feed of vehicle_location(s), issue_created and issue_resolved events.
+    The first 'ready' event carries the current change seq and vehicle positions;
+    'resync' means the client fell behind and should reload via /get_issues.
+    Needs a threaded server (the default for app.run) or gevent/gthread gunicorn workers.
+    """
+    subscriber = events.subscribe()
+    ready = events.format('ready', {'seq': store.seq, 'vehicles': fleet.locations()})
+    return Response(
+        events.stream(subscriber, first_message=ready),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/get_locations', methods=['GET'])
 def get_locations():
-    return jsonify(vehicle_locations)
+    return jsonify(fleet.locations())
+
+@app.route('/vehicle_track/<vehicle_id>', methods=['GET'])
+def vehicle_track(vehicle_id):
+    """Recent fixes for one vehicle, oldest first. Optional ?limit=N."""
+    points = fleet.history(vehicle_id, request.args.get('limit', type=int))
+    if points is None:
+        return jsonify({"status": "error", "message": "Vehicle not found."}), 404
+    return jsonify({"vehicle_id": vehicle_id, "points": points})
+
+@app.route('/nearest_vehicle', methods=['GET'])
+def nearest_vehicle():
+    """Nearest vehicles to ?issue_id= or ?lat=&lon=. Optional ?k= (default 1)."""
+    args = request.args
+    try:
+        if 'issue_id' in args:
+            issue = store.get(int(args['issue_id']))
+            lat, lon = _position(issue['latitude'], issue['longitude'])
+        else:
+            lat, lon = _position(args['lat'], args['lon'])
+        k = int(args.get('k', 1))
+        if k < 1:
+            raise ValueError(k)
+    except (KeyError, TypeError, ValueError):
+        return jsonify({
+            "status": "error",
+            "message": "Provide a known issue_id or in-range lat and lon, and an optional k >= 1."
+        }), 400
+    matches = fleet.nearest(lat, lon, k=k)
+    locations = fleet.locations()
+    return jsonify({"vehicles": [
+        {'vehicle_id': vehicle_id, 'distance_m': round(distance, 1), **locations[vehicle_id]}
+        for vehicle_id, distance in matches
+    ]})
 
 @app.route('/report_issue', methods=['POST'])
 def report_ai_issue():
     """Receives issues from your AI detection system."""
-    global issue_counter
     data = request.json
-    
-    issue_counter += 1
-    issue_id = issue_counter
-    
-    new_issue = {
-        'id': issue_id,
-        'issue_type': data.get('issue_type'),
-        'latitude': data.get('latitude'),
-        'longitude': data.get('longitude'),
-        'source': 'AI Detection'
-    }
-    issues[issue_id] = new_issue
-    print(f"✅ Received AI Issue #{issue_id}: {new_issue['issue_type']}")
-    return jsonify({"status": "success", "issue_id": issue_id})
+    issue_type = data.get('issue_type')
+    # Indexed by type, so it has to be a plain string
+    if not isinstance(issue_type, str) or not issue_type:
+        return jsonify({"status": "error", "message": "issue_type must be a non-empty string."}), 400
+
+    with stage_timer('store_write'):
+        new_issue = store.add({
+            'issue_type': issue_type,
+            'latitude': data.get('latitude'),
+            'longitude': data.get('longitude'),
+            'source': 'AI Detection',
+            'report_count': 1
+        }, merge_radius_m=DEDUP_RADIUS_METERS)
+    log.info("Received AI issue", extra={'issue_id': new_issue['id'], 'issue_type': new_issue['issue_type']})
+    return jsonify({"status": "success", "issue_id": new_issue['id']})
+
+def _as_float_array(values):
+    """Floats for a column of JSON values; anything non-numeric becomes NaN."""
+    try:
+        return np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        def to_float(value):
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return np.nan
+        return np.array([to_float(value) for value in values], dtype=float)
+
+@app.route('/report_issues_bulk', methods=['POST'])
+def report_ai_issues_bulk():
+    """
+    Receives a whole batch of AI detections: {"issues": [{"issue_type", "latitude", "longitude"}, ...]}.
+    Coordinates are validated column-wise and all valid rows are stored in one store transaction.
+    Rows with a missing or non-string issue_type or out-of-range coordinates are skipped and listed in 'rejected'.
+    Detections near an open issue of the same type are merged into it, so ids can repeat.
+    An optional per-row "track_id" marks distinct tracked objects: rows of one request with
+    different track_ids are never merged into each other, even at the same coordinates.
+    """
+    data = request.json
+    rows = data.get('issues') if isinstance(data, dict) else data
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        return jsonify({"status": "error", "message": "Expected a list of issue objects."}), 400
+
+    lat = _as_float_array([row.get('latitude') for row in rows])
+    lon = _as_float_array([row.get('longitude') for row in rows])
+    has_type = np.array([isinstance(row.get('issue_type'), str) and bool(row['issue_type']) for row in rows],
+                        dtype=bool)
+    with np.errstate(invalid='ignore'):
+        valid = has_type & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+
+    accepted = np.flatnonzero(valid)
+    with stage_timer('store_write'):
+        created = store.add_many([
+            {
+                'issue_type': rows[i]['issue_type'],
+                'latitude': float(lat[i]),
+                'longitude': float(lon[i]),
+                'source': 'AI Detection',
+                'report_count': 1
+            }
+            for i in accepted
+        ], merge_radius_m=DEDUP_RADIUS_METERS, track_ids=[
+            None if rows[i].get('track_id') is None else str(rows[i]['track_id']) for i in accepted
+        ])
+    rejected = np.flatnonzero(~valid).tolist()
+    log.info("Received AI issues in bulk", extra={'stored': len(created), 'rejected': len(rejected)})
+    return jsonify({
+        "status": "success",
+        "issue_ids": [issue['id'] for issue in created],
+        "rejected": rejected
+    })
 
 @app.route('/get_issues', methods=['GET'])
 def get_all_issues():
-    """Returns all reported issues, both AI and SOS."""
-    return jsonify(list(issues.values()))
+    """
+    Returns all reported issues, both AI and SOS. Optional ?issue_type= filter.
+    With ?since=<seq> only the issues added and ids removed after that seq are returned.
+    """
+    issue_type = request.args.get('issue_type')
+    since = request.args.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return jsonify({"status": "error", "message": "since must be an integer seq."}), 400
+        # reset: true means the client was too far behind and got a full snapshot
+        return _conditional_json(lambda: store.delta(since, issue_type))
+    if issue_type is not None:
+        return _conditional_json(lambda: store.by_type(issue_type))
+    return _conditional_json(store.all)
+
+@app.route('/get_issues_in_area', methods=['GET'])
+def get_issues_in_area():
+    """
+    Returns issues inside the map viewport.
+    Accepts either min_lat/min_lon/max_lat/max_lon or lat/lon/radius (meters).
+    """
+    args = request.args
+    try:
+        if 'radius' in args:
+            lat, lon = _finite_float(args['lat']), _finite_float(args['lon'])
+            radius = _finite_float(args['radius'])
+            if radius < 0:
+                raise ValueError(radius)
+            query = lambda: store.in_radius(lat, lon, radius)
+        else:
+            bbox = tuple(_finite_float(args[key]) for key in ('min_lat', 'min_lon', 'max_lat', 'max_lon'))
+            query = lambda: store.in_bbox(*bbox)
+    except (KeyError, ValueError):
+        return jsonify({
+            "status": "error",
+            "message": "Provide min_lat, min_lon, max_lat, max_lon or lat, lon, radius."
+        }), 400
+    # The lookup only runs when the client's copy is stale
+    return _conditional_json(query)
+
+@app.route('/get_issue_clusters', methods=['GET'])
+def get_issue_clusters():
+    """
+    Clustered view for zoomed-out maps: issue counts and centroids per grid cell
+    inside min_lat/min_lon/max_lat/max_lon. Optional cell_deg sets the cluster size
+    (default: about 16 clusters across the viewport width); it is rounded to a whole
+    number of 0.01 deg index cells and the size used is returned as cell_deg.
+    """
+    args = request.args
+    try:
+        min_lat, min_lon = _finite_float(args['min_lat']), _finite_float(args['min_lon'])
+        max_lat, max_lon = _finite_float(args['max_lat']), _finite_float(args['max_lon'])
+        cell_deg = float(args.get('cell_deg', (max_lon - min_lon) / 16))
+        if not math.isfinite(cell_deg) or cell_deg <= 0:
+            raise ValueError(cell_deg)
+    except (KeyError, ValueError):
+        return jsonify({
+            "status": "error",
+            "message": "Provide min_lat, min_lon, max_lat, max_lon and an optional positive cell_deg."
+        }), 400
+    return _conditional_json(lambda: {
+        "cell_deg": store.cluster_cell_deg(cell_deg),
+        "clusters": store.clusters(min_lat, min_lon, max_lat, max_lon, cell_deg)
+    })
 
 @app.route('/resolve_issue', methods=['POST'])
 def resolve_issue():
-    global issues
     issue_id_to_resolve = request.json.get('id')
-    if issue_id_to_resolve in issues:
-        del issues[issue_id_to_resolve]
+    if store.remove(issue_id_to_resolve):
         return jsonify({"status": "success", "message": f"Issue #{issue_id_to_resolve} resolved."})
     return jsonify({"status": "error", "message": "Issue not found."}), 404
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5003)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5003, threaded=True)
\ No newline at end of file
@@ -2,13 +2,19 @@ from flask import Flask, request, Response
 from twilio.twiml.voice_response import VoiceResponse, Record
 from twilio.rest import Client
 import os
+import sys
 import requests
 import whisper
 import openai
 from dotenv import load_dotenv 
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from shared.observability import get_logger, instrument_flask, stage_timer
+
 load_dotenv()
+log = get_logger("calling_agent")
 app = Flask(__name__)
+instrument_flask(app)
 
 # Base public URL for Twilio to call back (e.g., your ngrok domain)
 # Example: https://abcd-12-34-56-78.ngrok-free.app
@@ -36,7 +42,7 @@ if twilio_account_sid and twilio_auth_token:
     try:
         twilio_client = Client(twilio_account_sid, twilio_auth_token)
     except Exception as e:
-        print("Failed to init Twilio client:", str(e))
+        log.error("Failed to init Twilio client", extra={"error": str(e)})
 @app.route("/health", methods=["GET"]) 
 def health():
     return {"status": "ok"}, 200
@@ -66,7 +72,8 @@ def generate_ai_response(user_text: str) -> str:
                 ]
             }
             params = {"key": gemini_api_key}
-            resp = requests.post(url, headers=headers, params=params, json=payload, timeout=20)
+            with stage_timer("llm"):
+                resp = requests.post(url, headers=headers, params=params, json=payload, timeout=20)
             resp.raise_for_status()
             data = resp.json()
             # Parse Gemini response
@@ -78,23 +85,24 @@ def generate_ai_response(user_text: str) -> str:
             # Fallback if structure unexpected
             return "आपकी शिकायत दर्ज हो गई है। हमारी टीम शीघ्र संपर्क करेगी।"
         except Exception as e:
-            print("Gemini API error:", str(e))
+            log.error("Gemini API error", extra={"error": str(e)})
             return "आपकी शिकायत दर्ज हो गई है। हमारी टीम शीघ्र संपर्क करेगी।"
 
     if openai_api_key:
         try:
-            completion = openai.Completion.create(
-                model="gpt-3.5-turbo-instruct",
-                prompt=(
-                    f"The user reported a civic issue: {text}\n"
-                    "Respond briefly and helpfully in the same language, acknowledging receipt."
-                ),
-                temperature=0.6,
-                max_tokens=120,
-            )
+            with stage_timer("llm"):
+                completion = openai.Completion.create(
+                    model="gpt-3.5-turbo-instruct",
+                    prompt=(
+                        f"The user reported a civic issue: {text}\n"
+                        "Respond briefly and helpfully in the same language, acknowledging receipt."
+                    ),
+                    temperature=0.6,
+                    max_tokens=120,
+                )
             return completion.choices[0].text.strip()
         except Exception as api_err:
-            print("OpenAI completion error:", str(api_err))
+            log.error("OpenAI completion error", extra={"error": str(api_err)})
             return "आपकी शिकायत दर्ज हो गई है। हमारी टीम शीघ्र संपर्क करेगी।"
 
     return "आपकी शिकायत दर्ज हो गई है। हमारी टीम शीघ्र संपर्क करेगी।"
@@ -235,7 +243,7 @@ def make_outbound_call():
         )
         return {"status": "initiated", "sid": call.sid}
     except Exception as e:
-        print("Error initiating outbound call:", str(e))
+        log.error("Error initiating outbound call", extra={"error": str(e), "to": to_number})
         return {"error": str(e)}, 500
 
 @app.route("/process_speech", methods=["POST"])
@@ -243,14 +251,14 @@ def process_speech():
     """Handles Twilio <Gather input="speech"> results and responds immediately."""
     try:
         speech_text = request.form.get("SpeechResult", "").strip()
-        print("SpeechResult:", speech_text)
+        log.info("Speech result", extra={"speech_text": speech_text})
 
         if speech_text:
             ai_response = generate_ai_response(speech_text)
         else:
             ai_response = "क्षमा करें, मैं आपकी बात नहीं समझ पाया। कृपया दोबारा बताएं।"
     except Exception as e:
-        print("Error in process_speech:", str(e))
+        log.error("Error in process_speech", extra={"error": str(e)})
         ai_response = "क्षमा करें, एक त्रुटि हुई। कृपया बाद में पुनः प्रयास करें।"
 
     vr = VoiceResponse()
@@ -263,19 +271,19 @@ def process_speech():
 def process_recording():
     """
     Receives recording from Twilio, converts speech to text,
-    sends to Gemini, and prints AI response.
+    sends to Gemini, and logs the AI response.
     """
     try:
         recording_url = request.form.get("RecordingUrl")
         recording_sid = request.form.get("RecordingSid")
         recording_duration = request.form.get("RecordingDuration")
-        print("Recording webhook payload:", {
-            "RecordingUrl": recording_url,
-            "RecordingSid": recording_sid,
-            "RecordingDuration": recording_duration,
+        log.info("Recording webhook", extra={
+            "recording_url": recording_url,
+            "recording_sid": recording_sid,
+            "recording_duration": recording_duration,
         })
         if not recording_url:
-            print("Missing RecordingUrl in form payload")
+            log.warning("Missing RecordingUrl in form payload")
             return "No recording URL received", 400
 
         # Download recording from Twilio
@@ -289,23 +297,24 @@ def process_recording():
         for ext in [".mp3", ".wav"]:
             media_url = recording_url + ext
             try:
-                print(f"Downloading recording: {media_url}")
-                resp = requests.get(media_url, auth=auth, timeout=20)
+                log.debug("Downloading recording", extra={"url": media_url})
+                with stage_timer("download"):
+                    resp = requests.get(media_url, auth=auth, timeout=20)
                 if resp.status_code == 200 and resp.content:
                     audio_bytes = resp.content
                     chosen_ext = ext
-                    print(f"Downloaded {len(audio_bytes)} bytes as {ext}")
+                    log.info("Downloaded recording", extra={"bytes": len(audio_bytes), "ext": ext})
                     break
                 else:
                     err = f"HTTP {resp.status_code}, length={len(resp.content) if resp.content else 0}"
-                    print(f"Download failed: {err}")
+                    log.warning("Recording download failed", extra={"ext": ext, "error": err})
                     download_errors.append((ext, err))
             except Exception as dl_err:
-                print(f"Error downloading {ext}:", str(dl_err))
+                log.warning("Error downloading recording", extra={"ext": ext, "error": str(dl_err)})
                 download_errors.append((ext, str(dl_err)))
 
         if audio_bytes is None:
-            print("Failed to download recording. Tried:", download_errors)
+            log.error("Failed to download recording", extra={"attempts": download_errors})
             ai_response = "रिकॉर्डिंग डाउनलोड करने में समस्या आई। कृपया दोबारा कॉल करें।"
         else:
             temp_audio_path = os.path.join(TEMP_FOLDER, f"caller{chosen_ext}")
@@ -317,22 +326,23 @@ def process_recording():
                 global whisper_model
                 if whisper_model is None:
                     whisper_model = whisper.load_model("base")
-                result = whisper_model.transcribe(temp_audio_path)
+                with stage_timer("stt"):
+                    result = whisper_model.transcribe(temp_audio_path)
                 user_text = result.get("text", "")
-                print(f"Caller said: {user_text}")
+                log.info("Caller transcript", extra={"text": user_text})
             except Exception as stt_err:
-                print("Whisper STT error (check ffmpeg installation):", str(stt_err))
+                log.error("Whisper STT error (check ffmpeg installation)", extra={"error": str(stt_err)})
                 user_text = ""
 
             # --- Send text to AI or fallback ---
             if user_text.strip():
                 ai_response = generate_ai_response(user_text)
-                print(f"AI response: {ai_response}")
+                log.info("AI response", extra={"reply": ai_response})
             else:
                 ai_response = "Unable to detect speech."
 
     except Exception as e:
-        print("Error processing recording:", str(e))
+        log.error("Error processing recording", extra={"error": str(e)})
         ai_response = "Sorry, there was an error processing your recording."
 
     # --- Twilio response ---
@@ -0,0 +1,73 @@
+import json
+import queue
+import threading
+
+
+class EventBroadcaster:
+    """
+    Fans out events to every connected Server-Sent Events client.
+    Each event is encoded once and the same bytes are queued for all subscribers,
+    so the cost of an update does not grow with JSON work per viewer.
+    """
+
+    def __init__(self, max_queue=256, heartbeat_sec=15):
+        self.max_queue = max_queue
+        self.heartbeat_sec = heartbeat_sec
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    @staticmethod
+    def format(event, data, event_id=None):
+        message = f"event: {event}\n"
+        if event_id is not None:
+            message += f"id: {event_id}\n"
+        return message + f"data: {json.dumps(data)}\n\n"
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event, data, event_id=None):
+        message = self.format(event, data, event_id)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # Slow client: drop its backlog and tell it to reload from the REST endpoints
+                self._reset(subscriber)
+
+    def _reset(self, subscriber):
+        try:
+            while True:
+                subscriber.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            subscriber.put_nowait(self.format('resync', {}))
+        except queue.Full:
+            pass
+
+    def stream(self, subscriber, first_message=None):
+        """Generator of SSE frames for one client; unsubscribes when the client goes away."""
+        try:
+            if first_message:
+                yield first_message
+            while True:
+                try:
+                    yield subscriber.get(timeout=self.heartbeat_sec)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+        finally:
+            self.unsubscribe(subscriber)
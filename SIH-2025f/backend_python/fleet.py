@@ -0,0 +1,96 @@
+import threading
+import time
+from array import array
+
+from spatial_index import GridIndex
+
+
+class _Track:
+    """Fixed-size ring buffer of one vehicle's recent fixes, stored in flat float arrays."""
+
+    __slots__ = ('lat', 'lon', 'ts', 'head', 'count')
+
+    def __init__(self, size):
+        self.lat = array('d', bytes(8 * size))
+        self.lon = array('d', bytes(8 * size))
+        self.ts = array('d', bytes(8 * size))
+        self.head = 0
+        self.count = 0
+
+    def push(self, lat, lon, ts):
+        size = len(self.lat)
+        self.lat[self.head] = lat
+        self.lon[self.head] = lon
+        self.ts[self.head] = ts
+        self.head = (self.head + 1) % size
+        self.count = min(self.count + 1, size)
+
+    def points(self, limit=None):
+        """Oldest-to-newest fixes, optionally only the last `limit`."""
+        size = len(self.lat)
+        n = self.count if limit is None else min(limit, self.count)
+        start = (self.head - n) % size
+        result = []
+        for i in range(n):
+            j = (start + i) % size
+            result.append({'lat': self.lat[j], 'lon': self.lon[j], 'timestamp': self.ts[j]})
+        return result
+
+
+class FleetTracker:
+    """
+    Latest position and recent history for every vehicle, keyed by vehicle ID.
+    Latest positions are also kept in a GridIndex for nearest-vehicle lookups.
+    """
+
+    def __init__(self, history_size=300):
+        # 300 fixes at the simulator's 2 s cadence is ten minutes of trail per vehicle
+        self.history_size = history_size
+        self.latest = {}
+        self.index = GridIndex()
+        self._tracks = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.latest)
+
+    def update(self, vehicle_id, lat, lon, timestamp=None):
+        self.update_many([(vehicle_id, lat, lon, timestamp)])
+
+    def update_many(self, pings):
+        """Applies (vehicle_id, lat, lon, timestamp) tuples under a single lock acquisition."""
+        now = time.time()
+        with self._lock:
+            for vehicle_id, lat, lon, timestamp in pings:
+                track = self._tracks.get(vehicle_id)
+                if track is None:
+                    track = self._tracks[vehicle_id] = _Track(self.history_size)
+                track.push(lat, lon, now if timestamp is None else timestamp)
+                self.latest[vehicle_id] = {'lat': lat, 'lon': lon}
+                self.index.insert(vehicle_id, lat, lon)
+
+    def locations(self):
+        """Copy of the latest {vehicle_id: {'lat', 'lon'}} map, safe to serialize while pings arrive."""
+        with self._lock:
+            return dict(self.latest)
+
+    def history(self, vehicle_id, limit=None):
+        with self._lock:
+            track = self._tracks.get(vehicle_id)
+            return None if track is None else track.points(limit)
+
+    def nearest(self, lat, lon, k=1, max_radius_m=50000):
+        """
+        Returns up to k (vehicle_id, distance_m) pairs nearest to the point.
+        Searches a growing radius so only nearby grid cells are visited in a dense fleet.
+        """
+        with self._lock:
+            if not self.latest:
+                return []
+            radius = 500
+            while True:
+                found = self.index.query_radius(lat, lon, radius)
+                if len(found) >= k or radius >= max_radius_m:
+                    return found[:k]
+                radius = min(radius * 4, max_radius_m)
+
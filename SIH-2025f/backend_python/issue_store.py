@@ -0,0 +1,479 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import uuid
+from collections import defaultdict, deque
+
+from spatial_index import GridIndex, cluster_cell_size, format_clusters, haversine, radius_to_bbox
+
+# How many create/update/resolve events are kept for /get_issues?since= delta sync
+CHANGE_LOG_SIZE = 10000
+
+
+def _fold_changes(entries):
+    """
+    Collapses ordered (seq, op, issue_id) entries into (added_ids, removed_ids).
+    'added' covers issues created or updated in the window that are still open.
+    """
+    added, removed, created = {}, {}, set()
+    for _, op, issue_id in entries:
+        if op == 'resolve':
+            added.pop(issue_id, None)
+            if issue_id not in created:
+                removed[issue_id] = None
+        else:
+            added[issue_id] = None
+            if op == 'create':
+                created.add(issue_id)
+    return list(added), list(removed)
+
+
+def _merged(existing):
+    """Copy of an existing issue with one more report counted against it."""
+    return {**existing, 'report_count': existing.get('report_count', 1) + 1}
+
+
+class _BatchTracks:
+    """
+    Which issue each track of one add_many() call created or merged into, so that two
+    different tracked objects reported together never end up as the same issue.
+    """
+
+    def __init__(self):
+        self._owners = {}
+
+    def blocks(self, issue_id, track_id):
+        owner = self._owners.get(issue_id)
+        return track_id is not None and owner is not None and owner != track_id
+
+    def claim(self, issue_id, track_id):
+        if track_id is not None:
+            self._owners.setdefault(issue_id, track_id)
+
+
+def _coords(issue):
+    """(lat, lon) floats, or None if missing, non-numeric, NaN/inf or out of range (not indexed)."""
+    lat, lon = issue.get('latitude'), issue.get('longitude')
+    if lat is None or lon is None:
+        return None
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (math.isfinite(lat) and math.isfinite(lon) and abs(lat) <= 90 and abs(lon) <= 180):
+        return None
+    return lat, lon
+
+
+class IssueStore:
+    """
+    Common interface of the issue stores used by app.py.
+    Issues are plain dicts; the store assigns 'id' atomically on add.
+    With merge_radius_m, a new report within that distance of an open issue of the same
+    issue_type is merged into it ('report_count' goes up) instead of creating a duplicate.
+    add_many() takes optional track_ids, one per row: rows of one call with different
+    track_ids are distinct objects (e.g. two potholes seen from the same GPS fix) and are
+    never merged into the same issue, though either may still merge into an older one.
+    Listeners are called as listener(op, issue, seq) after every create/update/resolve.
+    Clusters are built on a grid of cell_size_deg cells, the same in every store.
+    """
+
+    def __init__(self, cell_size_deg=0.01):
+        self.cell_size_deg = cell_size_deg
+        self.listeners = []
+
+    def cluster_cell_deg(self, cell_size_deg):
+        """The cluster size clusters() uses for a requested cell_size_deg."""
+        return cluster_cell_size(cell_size_deg, self.cell_size_deg)
+
+    def _notify(self, op, issue, seq):
+        for listener in self.listeners:
+            listener(op, issue, seq)
+
+    def add(self, fields, merge_radius_m=None):
+        return self.add_many([fields], merge_radius_m)[0]
+
+    def delta(self, since, issue_type=None):
+        """Issues added and ids removed after `since`, or a full snapshot if the log is too short."""
+        seq, changes = self._changes_since(since)
+        if changes is None:
+            added, removed, reset = self.all(), [], True
+        else:
+            (ids, removed), reset = changes, False
+            added = self.get_many(ids)
+        if issue_type is not None:
+            added = [issue for issue in added if issue.get('issue_type') == issue_type]
+        return {"seq": seq, "reset": reset, "added": added, "removed": removed}
+
+
+class InMemoryIssueStore(IssueStore):
+    """
+    Process-local store with a grid index, source/type indexes and a bounded change log.
+    A single lock makes id allocation and index updates atomic under threaded servers;
+    it is not shared between worker processes (use SQLiteIssueStore for that).
+    """
+
+    def __init__(self, cell_size_deg=0.01):
+        super().__init__(cell_size_deg)
+        # Changes on restart so clients never trust an ETag from a previous run
+        self.epoch = uuid.uuid4().hex[:8]
+        self._issues = {}
+        self._next_id = 1
+        self._index = GridIndex(cell_size_deg)
+        # source / issue_type -> issue ids in insertion order (dicts used as ordered sets)
+        self._by_source = defaultdict(dict)
+        self._by_type = defaultdict(dict)
+        self._seq = 0
+        self._log = deque(maxlen=CHANGE_LOG_SIZE)
+        self._lock = threading.RLock()
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def __len__(self):
+        return len(self._issues)
+
+    def _record(self, op, issue):
+        self._seq += 1
+        self._log.append((self._seq, op, issue['id']))
+        self._notify(op, issue, self._seq)
+
+    @staticmethod
+    def _unlink(index, key, issue_id):
+        members = index.get(key)
+        if members is not None:
+            members.pop(issue_id, None)
+            if not members:
+                del index[key]
+
+    def _find_duplicate(self, fields, radius_m, skip=None):
+        coords = _coords(fields)
+        if coords is None:
+            return None
+        for issue_id, _ in self._index.query_radius(*coords, radius_m):
+            if skip and skip(issue_id):
+                continue
+            issue = self._issues[issue_id]
+            if issue.get('issue_type') == fields.get('issue_type'):
+                return issue
+        return None
+
+    def add_many(self, fields_list, merge_radius_m=None, track_ids=None):
+        # All or nothing, like SQLite's transaction: every row is checked before any is stored
+        for fields in fields_list:
+            hash((fields.get('source'), fields.get('issue_type')))  # index keys; TypeError if unhashable
+        stored = []
+        tracks = _BatchTracks()
+        with self._lock:
+            for fields, track_id in zip(fields_list, track_ids or [None] * len(fields_list)):
+                existing = merge_radius_m and self._find_duplicate(
+                    fields, merge_radius_m, skip=lambda issue_id: tracks.blocks(issue_id, track_id))
+                if existing:
+                    # Replace rather than mutate: readers may still be serializing the old dict
+                    issue = self._issues[existing['id']] = _merged(existing)
+                    tracks.claim(issue['id'], track_id)
+                    self._record('update', issue)
+                    stored.append(issue)
+                    continue
+                issue = {'id': self._next_id, **fields}
+                source, issue_type = issue.get('source'), issue.get('issue_type')
+                coords = _coords(issue)
+                self._next_id += 1
+                self._issues[issue['id']] = issue
+                self._by_source[source][issue['id']] = None
+                self._by_type[issue_type][issue['id']] = None
+                if coords is not None:
+                    self._index.insert(issue['id'], *coords)
+                tracks.claim(issue['id'], track_id)
+                self._record('create', issue)
+                stored.append(issue)
+        return stored
+
+    def remove(self, issue_id):
+        with self._lock:
+            issue = self._issues.pop(issue_id, None)
+            if issue is None:
+                return False
+            self._index.remove(issue_id)
+            self._unlink(self._by_source, issue.get('source'), issue_id)
+            self._unlink(self._by_type, issue.get('issue_type'), issue_id)
+            self._record('resolve', issue)
+            return True
+
+    def get(self, issue_id):
+        return self._issues.get(issue_id)
+
+    def get_many(self, ids):
+        with self._lock:
+            return [self._issues[i] for i in ids if i in self._issues]
+
+    def all(self):
+        with self._lock:
+            return list(self._issues.values())
+
+    def by_source(self, source):
+        with self._lock:
+            return [self._issues[i] for i in self._by_source.get(source, ())]
+
+    def by_type(self, issue_type):
+        with self._lock:
+            return [self._issues[i] for i in self._by_type.get(issue_type, ())]
+
+    def in_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        with self._lock:
+            ids = self._index.query_bbox(min_lat, min_lon, max_lat, max_lon)
+            return [self._issues[i] for i in ids]
+
+    def in_radius(self, lat, lon, radius_m):
+        with self._lock:
+            return [self._issues[i] for i, _ in self._index.query_radius(lat, lon, radius_m)]
+
+    def clusters(self, min_lat, min_lon, max_lat, max_lon, cell_size_deg):
+        with self._lock:
+            return self._index.clusters(min_lat, min_lon, max_lat, max_lon, cell_size_deg)
+
+    def _changes_since(self, since):
+        with self._lock:
+            log = self._log
+            if since > self._seq or (log and since < log[0][0] - 1):
+                return self._seq, None
+            # Walk back from the newest entry so the cost follows the number of changes
+            entries = []
+            for entry in reversed(log):
+                if entry[0] <= since:
+                    break
+                entries.append(entry)
+            entries.reverse()
+            return self._seq, _fold_changes(entries)
+
+
+class SQLiteIssueStore(IssueStore):
+    """
+    SQLite (WAL mode) store shared by every worker process pointing at the same file.
+    Ids come from AUTOINCREMENT inside a write transaction, so concurrent workers never collide,
+    and add_many() commits a whole batch in one transaction.
+    Listeners only see changes made through this process.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS issues (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT,
+            issue_type TEXT,
+            latitude REAL,
+            longitude REAL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS issues_source ON issues(source);
+        CREATE INDEX IF NOT EXISTS issues_type ON issues(issue_type);
+        CREATE INDEX IF NOT EXISTS issues_position ON issues(latitude, longitude);
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            op TEXT NOT NULL,
+            issue_id INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    """
+
+    def __init__(self, path, cell_size_deg=0.01):
+        super().__init__(cell_size_deg)
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('epoch', ?)", (uuid.uuid4().hex[:8],))
+        self.epoch = conn.execute("SELECT value FROM meta WHERE key = 'epoch'").fetchone()[0]
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL + NORMAL only fsyncs at checkpoints; a crash can lose the last commits, not corrupt
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_issue(row):
+        return {'id': row[0], **json.loads(row[1])}
+
+    @property
+    def seq(self):
+        row = self._conn().execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+        return row[0] if row else 0
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM issues").fetchone()[0]
+
+    def _log_change(self, conn, op, issue_id):
+        seq = conn.execute("INSERT INTO changes (op, issue_id) VALUES (?, ?)", (op, issue_id)).lastrowid
+        conn.execute("DELETE FROM changes WHERE seq <= ?", (seq - CHANGE_LOG_SIZE,))
+        return seq
+
+    def _find_duplicate(self, conn, fields, radius_m, skip=None):
+        coords = _coords(fields)
+        if coords is None:
+            return None
+        min_lat, min_lon, max_lat, max_lon = radius_to_bbox(*coords, radius_m)
+        rows = conn.execute(
+            "SELECT id, data, latitude, longitude FROM issues WHERE issue_type = ? "
+            "AND latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?",
+            (fields.get('issue_type'), min_lat, max_lat, min_lon, max_lon)
+        ).fetchall()
+        nearest = None
+        for row in rows:
+            if skip and skip(row[0]):
+                continue
+            distance = haversine(coords[0], coords[1], row[2], row[3])
+            if distance <= radius_m and (nearest is None or distance < nearest[0]):
+                nearest = (distance, row)
+        return None if nearest is None else self._row_to_issue(nearest[1])
+
+    def add_many(self, fields_list, merge_radius_m=None, track_ids=None):
+        conn = self._conn()
+        changes = []
+        tracks = _BatchTracks()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for fields, track_id in zip(fields_list, track_ids or [None] * len(fields_list)):
+                fields = {key: value for key, value in fields.items() if key != 'id'}
+                existing = merge_radius_m and self._find_duplicate(
+                    conn, fields, merge_radius_m, skip=lambda issue_id: tracks.blocks(issue_id, track_id))
+                if existing:
+                    issue = _merged(existing)
+                    tracks.claim(issue['id'], track_id)
+                    data = {key: value for key, value in issue.items() if key != 'id'}
+                    conn.execute("UPDATE issues SET data = ? WHERE id = ?", (json.dumps(data), issue['id']))
+                    changes.append(('update', issue, self._log_change(conn, 'update', issue['id'])))
+                    continue
+                coords = _coords(fields) or (None, None)
+                issue_id = conn.execute(
+                    "INSERT INTO issues (source, issue_type, latitude, longitude, data) VALUES (?, ?, ?, ?, ?)",
+                    (fields.get('source'), fields.get('issue_type'), coords[0], coords[1], json.dumps(fields))
+                ).lastrowid
+                issue = {'id': issue_id, **fields}
+                tracks.claim(issue_id, track_id)
+                changes.append(('create', issue, self._log_change(conn, 'create', issue_id)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        for op, issue, seq in changes:
+            self._notify(op, issue, seq)
+        return [issue for _, issue, _ in changes]
+
+    def remove(self, issue_id):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT id, data FROM issues WHERE id = ?", (issue_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute("DELETE FROM issues WHERE id = ?", (issue_id,))
+            seq = self._log_change(conn, 'resolve', issue_id)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._notify('resolve', self._row_to_issue(row), seq)
+        return True
+
+    def get(self, issue_id):
+        row = self._conn().execute("SELECT id, data FROM issues WHERE id = ?", (issue_id,)).fetchone()
+        return None if row is None else self._row_to_issue(row)
+
+    def get_many(self, ids):
+        conn = self._conn()
+        issues = []
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = conn.execute(f"SELECT id, data FROM issues WHERE id IN ({placeholders})", chunk)
+            found = {row[0]: row for row in rows}
+            issues.extend(self._row_to_issue(found[i]) for i in chunk if i in found)
+        return issues
+
+    def _select(self, where='', params=()):
+        rows = self._conn().execute(f"SELECT id, data FROM issues {where} ORDER BY id", params)
+        return [self._row_to_issue(row) for row in rows]
+
+    def all(self):
+        return self._select()
+
+    def by_source(self, source):
+        return self._select("WHERE source = ?", (source,))
+
+    def by_type(self, issue_type):
+        return self._select("WHERE issue_type = ?", (issue_type,))
+
+    def in_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        return self._select(
+            "WHERE latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?",
+            (min_lat, max_lat, min_lon, max_lon)
+        )
+
+    def in_radius(self, lat, lon, radius_m):
+        matches = []
+        for issue in self.in_bbox(*radius_to_bbox(lat, lon, radius_m)):
+            distance = haversine(lat, lon, float(issue['latitude']), float(issue['longitude']))
+            if distance <= radius_m:
+                matches.append((distance, issue))
+        matches.sort(key=lambda pair: pair[0])
+        return [issue for _, issue in matches]
+
+    def clusters(self, min_lat, min_lon, max_lat, max_lon, cell_size_deg):
+        # Sums per index cell (floor(lat / cell), as GridIndex computes it), merged into
+        # blocks here so both stores group points identically
+        factor = max(1, round(cell_size_deg / self.cell_size_deg))
+        rows = self._conn().execute(
+            "SELECT row, col, COUNT(*), SUM(latitude), SUM(longitude) FROM ("
+            " SELECT latitude, longitude,"
+            " CAST(latitude / :cell AS INTEGER) - (latitude / :cell < CAST(latitude / :cell AS INTEGER)) AS row,"
+            " CAST(longitude / :cell AS INTEGER) - (longitude / :cell < CAST(longitude / :cell AS INTEGER)) AS col"
+            " FROM issues WHERE latitude BETWEEN :min_lat AND :max_lat AND longitude BETWEEN :min_lon AND :max_lon"
+            ") GROUP BY row, col",
+            {'cell': self.cell_size_deg, 'min_lat': min_lat, 'max_lat': max_lat,
+             'min_lon': min_lon, 'max_lon': max_lon}
+        )
+        groups = defaultdict(lambda: [0, 0.0, 0.0])
+        for row, col, count, sum_lat, sum_lon in rows:
+            group = groups[(row // factor, col // factor)]
+            group[0] += count
+            group[1] += sum_lat
+            group[2] += sum_lon
+        return format_clusters(groups)
+
+    def _changes_since(self, since):
+        conn = self._conn()
+        # One read transaction so seq and the entries come from the same snapshot
+        conn.execute("BEGIN")
+        try:
+            seq = self.seq
+            first = conn.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+            if since > seq or (first is not None and since < first - 1):
+                return seq, None
+            entries = conn.execute(
+                "SELECT seq, op, issue_id FROM changes WHERE seq > ? ORDER BY seq", (since,)
+            ).fetchall()
+            return seq, _fold_changes(entries)
+        finally:
+            conn.execute("COMMIT")
+
+
+def create_store():
+    """
+    Builds the store selected by the ISSUE_STORE env var:
+    'memory' (default, single process) or 'sqlite' (file at ISSUE_DB_PATH, safe across workers).
+    """
+    kind = os.getenv('ISSUE_STORE', 'memory').lower()
+    if kind == 'sqlite':
+        return SQLiteIssueStore(os.getenv('ISSUE_DB_PATH', 'data/issues.db'))
+    if kind == 'memory':
+        return InMemoryIssueStore()
+    raise ValueError(f"Unknown ISSUE_STORE '{kind}', expected 'memory' or 'sqlite'")
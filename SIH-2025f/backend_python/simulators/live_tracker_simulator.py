@@ -1,9 +1,13 @@
-import requests
 import time
 import pandas as pd
+from reporting_client import ReportingClient
 
-API_ENDPOINT = 'http://127.0.0.1:5003/update_location'
+BULK_API_ENDPOINT = 'http://127.0.0.1:5003/update_locations_bulk'
 ROUTE_FILE = 'data/route_log.csv'
+VEHICLE_ID = 'MH01-AV1234'
+# Set above 1 to load-test the fleet store: extra vehicles replay the route with a small offset
+FLEET_SIZE = 1
+RETRY_FILE = 'data/pending_pings.jsonl'
 
 print("Starting live location simulation...")
 try:
@@ -12,15 +16,21 @@ except FileNotFoundError:
     print(f"ERROR: The route file was not found at '{ROUTE_FILE}'")
     exit()
 
+# Pings go out from a background thread, so a slow backend never delays the replay;
+# pings sent while the server is down are kept on disk and replayed in order once it is back
+client = ReportingClient(BULK_API_ENDPOINT, 'pings', RETRY_FILE)
+
 for index, row in route_df.iterrows():
-    payload = {'lat': row['latitude'], 'lon': row['longitude']}
-    try:
-        requests.post(API_ENDPOINT, json=payload)
-        print(f"Sent location: {payload['lat']}, {payload['lon']}")
-    except requests.exceptions.RequestException as e:
-        print(f"Error connecting to server: {e}")
-    
+    # The ping time travels with it, so a ping replayed after an outage lands at the right point in the track
+    payload = {'vehicle_id': VEHICLE_ID, 'lat': row['latitude'], 'lon': row['longitude'], 'timestamp': time.time()}
+    client.submit(payload)
+    for i in range(1, FLEET_SIZE):
+        client.submit({**payload, 'vehicle_id': f'SIM-{i:04d}', 'lat': row['latitude'] + i * 0.0005})
+    print(f"Queued location: {payload['lat']}, {payload['lon']}")
+
     # Simulate a 2-second delay between GPS pings
     time.sleep(2)
 
-print("Live location simulation finished.")
\ No newline at end of file
+client.close()
+print(f"Live location simulation finished. Sent {client.sent} pings, "
+      f"{client.pending_retries} waiting in {RETRY_FILE}.")
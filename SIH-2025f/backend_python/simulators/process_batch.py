@@ -1,18 +1,33 @@
+import argparse
 import cv2
+import itertools
 import pandas as pd
-import requests
+import queue
+import threading
 import time
 from ultralytics import YOLO
 import math
+import numpy as np
+from reporting_client import ReportingClient
+from tracker import IoUTracker
 
 # --- CONFIGURATION ---
 MODEL_PATH = 'best.pt'
 VIDEO_PATH = 'data/mumbai_drive.mp4'
 GPS_LOG_PATH = 'data/route_log.csv'
-API_ENDPOINT = 'http://127.0.0.1:5003/report_issue'
+API_ENDPOINT = 'http://127.0.0.1:5003/report_issues_bulk'
 CONFIDENCE_THRESHOLD = 0.60
 # --- NEW: Minimum distance (in meters) between reported issues to avoid duplicates ---
 MIN_DISTANCE_METERS = 10
+# --- Throughput settings (overridable from the command line) ---
+FRAME_STRIDE = 5   # Run the model on every Nth frame
+BATCH_SIZE = 8     # Frames sent to the model in one call
+PREFETCH_BATCHES = 4  # Decoded batches buffered ahead of the model in pipelined mode
+# --- Tracking: one report per object seen across consecutive sampled frames ---
+TRACK_MAX_MISSED = 2  # Sampled frames a track may go undetected before it ends
+REPORT_FIELDS = ('issue_type', 'latitude', 'longitude', 'confidence', 'timestamp')
+REPORT_BATCH_SIZE = 500  # Issues per bulk request
+RETRY_FILE = 'data/pending_issues.jsonl'  # Reports not yet accepted by the backend
 
 # --- Helper function to calculate distance between two GPS coordinates ---
 def haversine(lat1, lon1, lat2, lon2):
@@ -25,61 +40,216 @@ def haversine(lat1, lon1, lat2, lon2):
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
     return R * c
 
-# --- INITIALIZATION ---
-print("Loading AI model...")
-model = YOLO(MODEL_PATH)
-print("Loading video and GPS data...")
-gps_log = pd.read_csv(GPS_LOG_PATH)
-cap = cv2.VideoCapture(VIDEO_PATH)
-fps = cap.get(cv2.CAP_PROP_FPS)
-frame_number = 0
-last_reported_location = None # Keep track of the last issue's location
-print("Starting batch processing of video...")
-
-# --- MAIN PROCESSING LOOP ---
-while cap.isOpened():
-    ret, frame = cap.read()
-    if not ret:
-        break
-
-    if frame_number % 5 == 0:
-        current_time_sec = frame_number / fps
-        closest_gps_row = gps_log.iloc[(gps_log['timestamp_sec'] - current_time_sec).abs().idxmin()]
-        lat, lon = closest_gps_row['latitude'], closest_gps_row['longitude']
-        
-        results = model(frame)
-
-        for result in results:
-            for box in result.boxes:
-                if box.conf > CONFIDENCE_THRESHOLD:
-                    # --- NEW: Check distance before reporting ---
-                    should_report = False
-                    if last_reported_location is None:
-                        should_report = True
-                    else:
-                        distance = haversine(lat, lon, last_reported_location['lat'], last_reported_location['lon'])
-                        if distance > MIN_DISTANCE_METERS:
-                            should_report = True
-
-                    if should_report:
-                        class_id = int(box.cls)
-                        issue_type = model.names[class_id]
-                        
-                        payload = {
-                            'issue_type': issue_type,
-                            'latitude': lat,
-                            'longitude': lon,
-                            'confidence': float(box.conf),
-                            'timestamp': time.time() * 1000
-                        }
-                        
-                        try:
-                            requests.post(API_ENDPOINT, json=payload)
-                            last_reported_location = {'lat': lat, 'lon': lon} # Update the last reported location
-                        except requests.exceptions.RequestException:
-                            print(f"Could not report issue. Is server running?")
-
-    frame_number += 1
-
-cap.release()
-print("Batch processing complete.")
+# --- GPS alignment ---
+def load_gps_track(path):
+    """Reads the route log into (timestamps, latitudes, longitudes) arrays sorted by time."""
+    gps_log = pd.read_csv(path).sort_values('timestamp_sec')
+    return (
+        gps_log['timestamp_sec'].to_numpy(dtype=float),
+        gps_log['latitude'].to_numpy(dtype=float),
+        gps_log['longitude'].to_numpy(dtype=float)
+    )
+
+def locate_frames(gps_track, times_sec, interpolate=False):
+    """
+    Positions for many video timestamps at once.
+    Uses the nearest GPS fix (binary search) or, with interpolate=True,
+    linear interpolation between the surrounding fixes.
+    """
+    timestamps, lats, lons = gps_track
+    times = np.asarray(times_sec, dtype=float)
+    if interpolate:
+        return np.interp(times, timestamps, lats), np.interp(times, timestamps, lons)
+    if len(timestamps) == 1:
+        return np.full(times.shape, lats[0]), np.full(times.shape, lons[0])
+    right = np.clip(np.searchsorted(timestamps, times), 1, len(timestamps) - 1)
+    left = right - 1
+    # Ties go to the earlier fix
+    nearest = np.where(times - timestamps[left] <= timestamps[right] - times, left, right)
+    return lats[nearest], lons[nearest]
+
+# --- Frame pipeline ---
+def read_frames(cap, stride, start_frame=0, end_frame=None):
+    """
+    Yields (frame_number, frame) for every stride-th frame in [start_frame, end_frame).
+    Skipped frames are only grabbed, never converted to images.
+    """
+    if start_frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    frame_number = start_frame
+    while end_frame is None or frame_number < end_frame:
+        if frame_number % stride == 0:
+            ret, frame = cap.read()
+            if not ret:
+                return
+            yield frame_number, frame
+        elif not cap.grab():
+            return
+        frame_number += 1
+
+def batched(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def prefetch(items, max_items):
+    """
+    Runs the `items` generator on a background thread and hands its values over
+    through a bounded queue, so video decoding overlaps with model inference.
+    """
+    buffer = queue.Queue(maxsize=max_items)
+    done = object()
+    errors = []
+
+    def produce():
+        try:
+            for item in items:
+                buffer.put(item)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            buffer.put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item = buffer.get()
+        if item is done:
+            break
+        yield item
+    if errors:
+        raise errors[0]
+
+# --- Detection ---
+def detect_video(model, video_path, gps_track, stride=FRAME_STRIDE, batch_size=BATCH_SIZE,
+                 pipelined=True, interpolate_gps=False, start_frame=0, end_frame=None):
+    """
+    Runs the detector over a video (or the frame range [start_frame, end_frame))
+    and returns every detection above CONFIDENCE_THRESHOLD, in frame order.
+    Besides the report fields, each detection carries its frame_number, class_id and box.
+    """
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    detections = []
+
+    batches = batched(read_frames(cap, stride, start_frame, end_frame), batch_size)
+    if pipelined:
+        batches = prefetch(batches, PREFETCH_BATCHES)
+
+    sampled_frames = 0
+    start = time.time()
+    for batch in batches:
+        results = model([frame for _, frame in batch], verbose=False)
+        sampled_frames += len(batch)
+
+        lats, lons = locate_frames(gps_track, [frame_number / fps for frame_number, _ in batch], interpolate_gps)
+
+        for (frame_number, _), result, lat, lon in zip(batch, results, lats.tolist(), lons.tolist()):
+            boxes = result.boxes
+            for confidence, cls, xyxy in zip(boxes.conf.tolist(), boxes.cls.tolist(), boxes.xyxy.tolist()):
+                if confidence > CONFIDENCE_THRESHOLD:
+                    class_id = int(cls)
+                    detections.append({
+                        'issue_type': model.names[class_id],
+                        'latitude': lat,
+                        'longitude': lon,
+                        'confidence': confidence,
+                        'timestamp': time.time() * 1000,
+                        'frame_number': frame_number,
+                        'class_id': class_id,
+                        'box': xyxy
+                    })
+
+    video_frames = int(cap.get(cv2.CAP_PROP_POS_FRAMES)) - start_frame
+    cap.release()
+    elapsed = max(time.time() - start, 1e-9)
+    print(f"Processed {video_frames} video frames ({sampled_frames} sampled) in {elapsed:.1f}s: "
+          f"{video_frames / elapsed:.1f} video FPS, {sampled_frames / elapsed:.1f} inference FPS")
+    return detections
+
+def gate_by_distance(detections, min_distance=MIN_DISTANCE_METERS):
+    """Drops detections closer than min_distance to the previously kept one."""
+    kept = []
+    last_reported_location = None # Keep track of the last issue's location
+    for detection in detections:
+        lat, lon = detection['latitude'], detection['longitude']
+        if last_reported_location is None or haversine(
+                lat, lon, last_reported_location['lat'], last_reported_location['lon']) > min_distance:
+            kept.append(detection)
+            last_reported_location = {'lat': lat, 'lon': lon}
+    return kept
+
+def track_detections(detections, stride=FRAME_STRIDE):
+    """
+    Links detections across sampled frames with an IoU/centroid tracker and keeps
+    one detection per track: the one with the best confidence, tagged with its track_id
+    so the backend does not merge two objects that share a GPS fix.
+    """
+    tracker = IoUTracker(max_gap_frames=stride * TRACK_MAX_MISSED)
+    finished = []
+    for frame_number, frame_detections in itertools.groupby(detections, key=lambda d: d['frame_number']):
+        finished.extend(tracker.update(frame_number, list(frame_detections)))
+    finished.extend(tracker.flush())
+    finished.sort(key=lambda track: track.first_frame)
+    return [{**track.best, 'track_id': track.track_id} for track in finished]
+
+def select_reports(detections, dedup='track', stride=FRAME_STRIDE):
+    """Dedups frame-ordered detections by tracking ('track') or by distance gating ('distance')."""
+    if dedup == 'distance':
+        return gate_by_distance(detections)
+    return track_detections(detections, stride)
+
+def process_video(model, video_path, gps_track, stride=FRAME_STRIDE, batch_size=BATCH_SIZE,
+                  pipelined=True, interpolate_gps=False, dedup='track'):
+    """Runs the detector over a whole video and returns the issue payloads to report."""
+    detections = detect_video(model, video_path, gps_track, stride, batch_size, pipelined, interpolate_gps)
+    return select_reports(detections, dedup, stride)
+
+def report_detections(detections):
+    """
+    Hands detections to a background ReportingClient and waits for it to drain.
+    Reports the backend cannot take right now are kept in RETRY_FILE and sent on the next run.
+    """
+    client = ReportingClient(API_ENDPOINT, 'issues', RETRY_FILE, batch_size=REPORT_BATCH_SIZE)
+    if detections:
+        print(f"Reporting {len(detections)} issues...")
+    for detection in detections:
+        report = {field: detection[field] for field in REPORT_FIELDS}
+        if 'track_id' in detection:
+            report['track_id'] = detection['track_id']
+        client.submit(report)
+    client.close()
+    print(f"Sent {client.sent} issues, {client.failed} rejected, {client.pending_retries} waiting in {RETRY_FILE}.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect road issues in dashcam footage and report them.")
+    parser.add_argument('--video', default=VIDEO_PATH)
+    parser.add_argument('--gps', default=GPS_LOG_PATH)
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--stride', type=int, default=FRAME_STRIDE, help="run the model on every Nth frame")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="frames per model call")
+    parser.add_argument('--no-pipeline', action='store_true',
+                        help="decode on the inference thread instead of a background thread")
+    parser.add_argument('--interpolate-gps', action='store_true',
+                        help="interpolate between GPS fixes instead of using the nearest one")
+    parser.add_argument('--dedup', choices=['track', 'distance'], default='track',
+                        help="one report per tracked object, or the older minimum-distance gating")
+    args = parser.parse_args()
+
+    print("Loading AI model...")
+    model = YOLO(args.model)
+    print("Loading video and GPS data...")
+    gps_track = load_gps_track(args.gps)
+    print("Starting batch processing of video...")
+    detections = process_video(model, args.video, gps_track, args.stride, args.batch_size,
+                               pipelined=not args.no_pipeline, interpolate_gps=args.interpolate_gps,
+                               dedup=args.dedup)
+    report_detections(detections)
+    print("Batch processing complete.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import multiprocessing
+import os
+import time
+
+import cv2
+
+from process_batch import (
+    BATCH_SIZE, FRAME_STRIDE, GPS_LOG_PATH, MODEL_PATH, VIDEO_PATH,
+    detect_video, load_gps_track, report_detections, select_reports
+)
+
+# --- CONFIGURATION ---
+SEGMENT_SECONDS = 120  # Length of the time slice each worker processes at a time
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+# Set once per worker process by init_worker
+_model = None
+_gps_tracks = {}
+
+def init_worker(model_path, torch_threads):
+    """Loads one YOLO instance per worker and keeps it for every segment that worker runs."""
+    global _model
+    import torch
+    from ultralytics import YOLO
+    # Workers already use every core between them; more intra-op threads would just contend
+    torch.set_num_threads(torch_threads)
+    _model = YOLO(model_path)
+
+def run_segment(segment):
+    video_path, gps_path, start_frame, end_frame, stride, batch_size, interpolate_gps = segment
+    if gps_path not in _gps_tracks:
+        _gps_tracks[gps_path] = load_gps_track(gps_path)
+    # The decode thread would compete with other workers for cores, so decode inline here
+    return detect_video(_model, video_path, _gps_tracks[gps_path], stride, batch_size,
+                        pipelined=False, interpolate_gps=interpolate_gps,
+                        start_frame=start_frame, end_frame=end_frame)
+
+def find_videos(path):
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.lower().endswith(VIDEO_EXTENSIONS)
+        )
+    return [path]
+
+def gps_log_for(video_path, default_gps_path):
+    """Uses '<video name>.csv' next to the video if it exists, else the default route log."""
+    candidate = os.path.splitext(video_path)[0] + '.csv'
+    return candidate if os.path.exists(candidate) else default_gps_path
+
+def plan_segments(video_paths, default_gps_path, segment_seconds, stride, batch_size, interpolate_gps):
+    """Splits every video into consecutive frame ranges of about segment_seconds."""
+    segments = []
+    total_frames = 0
+    for video_path in video_paths:
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        if frame_count <= 0:
+            print(f"Skipping {video_path}: could not read frame count.")
+            continue
+        total_frames += frame_count
+        segment_frames = max(stride, int(segment_seconds * fps))
+        gps_path = gps_log_for(video_path, default_gps_path)
+        for start_frame in range(0, frame_count, segment_frames):
+            end_frame = min(start_frame + segment_frames, frame_count)
+            segments.append((video_path, gps_path, start_frame, end_frame, stride, batch_size, interpolate_gps))
+    return segments, total_frames
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Process dashcam footage on a pool of worker processes, one YOLO model per worker."
+    )
+    parser.add_argument('--video', default=VIDEO_PATH, help="a video file or a directory of videos")
+    parser.add_argument('--gps', default=GPS_LOG_PATH,
+                        help="route log used for videos without a '<video name>.csv' next to them")
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--segment-seconds', type=float, default=SEGMENT_SECONDS)
+    parser.add_argument('--stride', type=int, default=FRAME_STRIDE, help="run the model on every Nth frame")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="frames per model call")
+    parser.add_argument('--interpolate-gps', action='store_true',
+                        help="interpolate between GPS fixes instead of using the nearest one")
+    parser.add_argument('--dedup', choices=['track', 'distance'], default='track',
+                        help="one report per tracked object, or the older minimum-distance gating")
+    args = parser.parse_args()
+
+    video_paths = find_videos(args.video)
+    segments, total_frames = plan_segments(video_paths, args.gps, args.segment_seconds,
+                                           args.stride, args.batch_size, args.interpolate_gps)
+    if not segments:
+        print("No video frames to process.")
+        return
+    workers = max(1, min(args.workers, len(segments)))
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"Processing {len(video_paths)} video(s), {total_frames} frames, "
+          f"as {len(segments)} segments on {workers} workers...")
+
+    start = time.time()
+    detections_by_video = {video_path: [] for video_path in video_paths}
+    # spawn: forking a process that may already hold torch/OpenCV threads is not safe
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers, initializer=init_worker, initargs=(args.model, torch_threads)) as pool:
+        # imap keeps segment order, so each video's detections stay in frame order
+        for segment, detections in zip(segments, pool.imap(run_segment, segments)):
+            detections_by_video[segment[0]].extend(detections)
+
+    # Workers return raw frame-tagged detections; deduping each video's merged list once gives the
+    # same reports as a single-process run, so a pothole straddling a segment boundary is reported once
+    merged = []
+    for video_index, video_path in enumerate(video_paths):
+        reports = select_reports(detections_by_video[video_path], args.dedup, args.stride)
+        for report in reports:
+            if 'track_id' in report:
+                # Track ids restart for every video; keep them distinct within the upload
+                report['track_id'] = f"{video_index}:{report['track_id']}"
+        merged.extend(reports)
+    elapsed = max(time.time() - start, 1e-9)
+    print(f"Processed {total_frames} frames in {elapsed:.1f}s ({total_frames / elapsed:.1f} video FPS).")
+
+    report_detections(merged)
+    print("Parallel processing complete.")
+
+if __name__ == '__main__':
+    main()
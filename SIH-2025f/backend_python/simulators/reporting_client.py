@@ -0,0 +1,204 @@
+import json
+import os
+import queue
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class ReportingClient:
+    """
+    Posts reports to a bulk endpoint from a background thread, so callers never
+    wait on the backend.
+
+    - One pooled requests.Session keeps the TCP connection alive between posts.
+    - Queued items are sent together, up to batch_size per request; `linger`
+      waits that many seconds for more items before sending a partial batch.
+    - Batches that fail with a connection error or 5xx are appended to a JSON-lines
+      retry file (capped at max_retry_items, oldest dropped first). After each backoff
+      wait the retry file is sent first; until it goes through, newly queued items are
+      moved behind it, so the backend receives reports in order, including after a restart.
+    """
+
+    def __init__(self, endpoint, wrap_key, retry_path, batch_size=100, linger=0.0,
+                 max_queue=10000, max_retry_items=100000, timeout=10):
+        self.endpoint = endpoint
+        self.wrap_key = wrap_key  # e.g. 'issues' -> {"issues": [...]}
+        self.retry_path = retry_path
+        self.batch_size = batch_size
+        self.linger = linger
+        self.max_retry_items = max_retry_items
+        self.timeout = timeout
+        self.sent = 0
+        self.failed = 0
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._file_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._backoff = 0.0
+        self._sending_path = retry_path + '.sending'
+        self._recover_sending_file()
+        self._retry_count = len(self._read_retry_file())
+        self._session = requests.Session()
+        self._session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self._session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # --- Public API ---
+    def submit(self, item):
+        """Queues one report. Never blocks: if the queue is full the item goes to the retry file."""
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._spill([item])
+
+    def close(self, timeout=30):
+        """Stops accepting work and waits up to `timeout` seconds for the queue to drain."""
+        self._closed.set()
+        self._thread.join(timeout)
+        # Anything the sender could not get to is kept for the next run
+        leftover = self._drain_queue()
+        if leftover:
+            self._spill(leftover)
+        if self._thread.is_alive():
+            # Closing the session now would cut off the post in progress
+            print(f"Sender still posting to {self.endpoint} after {timeout}s; "
+                  f"that batch is lost if the process exits before it finishes.")
+        else:
+            self._session.close()
+
+    @property
+    def pending_retries(self):
+        return self._retry_count
+
+    # --- Sender thread ---
+    def _run(self):
+        while True:
+            if self._backoff and self._closed.wait(self._backoff):
+                # Backend is down and we are shutting down: close() keeps the rest on disk
+                break
+            if self._retry_count and not self._resend_retries():
+                self._increase_backoff()
+                # Still down: newer items wait behind the older ones on disk
+                pending = self._drain_queue()
+                if pending:
+                    self._spill(pending)
+                continue
+            batch = self._next_batch()
+            if batch:
+                self._send_or_spill(batch)
+            elif self._closed.is_set():
+                break
+
+    def _drain_queue(self):
+        items = []
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                return items
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.time() + self.linger
+        while len(batch) < self.batch_size:
+            try:
+                remaining = deadline - time.time()
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _post(self, batch):
+        """True if the backend took the batch (or rejected it as malformed, which retrying won't fix)."""
+        try:
+            response = self._session.post(self.endpoint, json={self.wrap_key: batch}, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            print(f"Could not reach {self.endpoint}: {e}")
+            return False
+        if response.status_code >= 500:
+            print(f"Server error {response.status_code} from {self.endpoint}")
+            return False
+        if response.status_code >= 400:
+            print(f"Dropped {len(batch)} reports rejected with HTTP {response.status_code}")
+            self.failed += len(batch)
+            return True
+        self.sent += len(batch)
+        return True
+
+    def _send_or_spill(self, batch):
+        if self._post(batch):
+            self._backoff = 0.0
+        else:
+            self._spill(batch)
+            self._increase_backoff()
+
+    def _increase_backoff(self):
+        self._backoff = min(max(self._backoff * 2, 1.0), 30.0)
+
+    def _resend_retries(self):
+        """
+        Sends the retry file oldest first. True once it is empty; the backoff resets only then.
+        The file is moved aside while its batches are posted, so submit() can keep spilling
+        to a fresh one without waiting on the network.
+        """
+        with self._file_lock:
+            if os.path.exists(self.retry_path):
+                os.replace(self.retry_path, self._sending_path)
+            self._retry_count = 0
+        items = self._read_retry_file(self._sending_path)
+        for start in range(0, len(items), self.batch_size):
+            if not self._post(items[start:start + self.batch_size]):
+                with self._file_lock:
+                    # Unsent items go back in front of anything spilled meanwhile
+                    self._write_retry_file(items[start:] + self._read_retry_file())
+                    os.remove(self._sending_path)
+                return False
+        if os.path.exists(self._sending_path):
+            os.remove(self._sending_path)
+        self._backoff = 0.0
+        if items:
+            print(f"Re-sent {len(items)} queued reports.")
+        return True
+
+    # --- Retry file ---
+    def _read_retry_file(self, path=None):
+        path = path or self.retry_path
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _recover_sending_file(self):
+        """A previous run stopped mid-resend: put its items back in front of the retry file."""
+        if os.path.exists(self._sending_path):
+            self._write_retry_file(self._read_retry_file(self._sending_path) + self._read_retry_file())
+            os.remove(self._sending_path)
+
+    def _write_retry_file(self, items):
+        items = items[-self.max_retry_items:]
+        tmp_path = self.retry_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.writelines(json.dumps(item) + '\n' for item in items)
+        os.replace(tmp_path, self.retry_path)
+        self._retry_count = len(items)
+
+    def _spill(self, items):
+        with self._file_lock:
+            os.makedirs(os.path.dirname(self.retry_path) or '.', exist_ok=True)
+            with open(self.retry_path, 'a') as f:
+                f.writelines(json.dumps(item) + '\n' for item in items)
+            self._retry_count += len(items)
+            # Appending is cheap; trim to the newest items only once the file is well over the cap
+            if self._retry_count > self.max_retry_items * 1.1:
+                self._write_retry_file(self._read_retry_file())
+        print(f"Queued {len(items)} reports for retry in {self.retry_path}")
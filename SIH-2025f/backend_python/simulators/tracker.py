@@ -0,0 +1,115 @@
+import itertools
+
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU between two (N, 4) and (M, 4) arrays of x1, y1, x2, y2 boxes."""
+    a = np.asarray(boxes_a, dtype=float).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=float).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def centroid_distance_matrix(boxes_a, boxes_b):
+    """Pairwise centroid distance, in units of the larger box's diagonal."""
+    a = np.asarray(boxes_a, dtype=float).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=float).reshape(-1, 4)
+    centers_a = (a[:, :2] + a[:, 2:]) / 2
+    centers_b = (b[:, :2] + b[:, 2:]) / 2
+    distance = np.linalg.norm(centers_a[:, None, :] - centers_b[None, :, :], axis=2)
+    diag_a = np.linalg.norm(a[:, 2:] - a[:, :2], axis=1)
+    diag_b = np.linalg.norm(b[:, 2:] - b[:, :2], axis=1)
+    scale = np.maximum(np.maximum(diag_a[:, None], diag_b[None, :]), 1e-9)
+    return distance / scale
+
+
+class Track:
+    __slots__ = ('track_id', 'class_id', 'box', 'first_frame', 'last_frame', 'hits', 'best')
+
+    def __init__(self, track_id, class_id, box, frame_number, detection):
+        self.track_id = track_id
+        self.class_id = class_id
+        self.box = box
+        self.first_frame = frame_number
+        self.last_frame = frame_number
+        self.hits = 1
+        self.best = detection
+
+    def add(self, box, frame_number, detection):
+        self.box = box
+        self.last_frame = frame_number
+        self.hits += 1
+        if detection['confidence'] > self.best['confidence']:
+            self.best = detection
+
+
+class IoUTracker:
+    """
+    Greedy IoU / centroid tracker for detections from a moving dashcam.
+    Each detection is matched to the live track of the same class with the highest
+    box overlap; if nothing overlaps enough, the nearest centroid within
+    max_centroid_distance (in box diagonals) is used, since objects slide down
+    the frame between sampled frames. Tracks unseen for more than max_gap_frames end.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_centroid_distance=1.0, max_gap_frames=15, min_hits=1):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.max_gap_frames = max_gap_frames
+        self.min_hits = min_hits
+        self._tracks = []
+        self._ids = itertools.count(1)
+
+    def update(self, frame_number, detections):
+        """
+        Feeds one frame's detections (dicts with 'box' and 'class_id') in frame order.
+        Returns the tracks that ended before this frame.
+        """
+        finished = [t for t in self._tracks if frame_number - t.last_frame > self.max_gap_frames]
+        self._tracks = [t for t in self._tracks if frame_number - t.last_frame <= self.max_gap_frames]
+
+        unmatched = list(range(len(detections)))
+        if self._tracks and detections:
+            track_boxes = [t.box for t in self._tracks]
+            det_boxes = [d['box'] for d in detections]
+            iou = iou_matrix(track_boxes, det_boxes)
+            centroid = centroid_distance_matrix(track_boxes, det_boxes)
+            # Lower cost is better: overlaps rank ahead of centroid-only matches
+            cost = np.where(iou >= self.iou_threshold, 1 - iou,
+                            np.where(centroid <= self.max_centroid_distance, 1 + centroid, np.inf))
+            same_class = (np.array([t.class_id for t in self._tracks])[:, None]
+                          == np.array([d['class_id'] for d in detections])[None, :])
+            cost[~same_class] = np.inf
+
+            used_tracks = set()
+            matched = set()
+            for flat in np.argsort(cost, axis=None):
+                t, d = np.unravel_index(flat, cost.shape)
+                if not np.isfinite(cost[t, d]):
+                    break
+                if t in used_tracks or d in matched:
+                    continue
+                self._tracks[t].add(detections[d]['box'], frame_number, detections[d])
+                used_tracks.add(t)
+                matched.add(d)
+            unmatched = [d for d in unmatched if d not in matched]
+
+        for d in unmatched:
+            detection = detections[d]
+            self._tracks.append(Track(next(self._ids), detection['class_id'], detection['box'],
+                                      frame_number, detection))
+        return [t for t in finished if t.hits >= self.min_hits]
+
+    def flush(self):
+        """Ends every live track (call after the last frame)."""
+        finished = [t for t in self._tracks if t.hits >= self.min_hits]
+        self._tracks = []
+        return finished
@@ -0,0 +1,162 @@
+import math
+from collections import defaultdict
+
+EARTH_RADIUS_METERS = 6371000
+METERS_PER_DEGREE_LAT = 111320
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters between two GPS coordinates."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    delta_phi = math.radians(lat2 - lat1)
+    delta_lambda = math.radians(lon2 - lon1)
+    a = math.sin(delta_phi / 2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2)**2
+    return EARTH_RADIUS_METERS * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def radius_to_bbox(lat, lon, radius_m):
+    """Returns (min_lat, min_lon, max_lat, max_lon) enclosing a circle of radius_m."""
+    dlat = radius_m / METERS_PER_DEGREE_LAT
+    dlon = radius_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+
+def cluster_cell_size(cell_size_deg, base_cell_deg):
+    """The size clusters are actually built at: cell_size_deg rounded to a whole number of index cells."""
+    return base_cell_deg * max(1, round(cell_size_deg / base_cell_deg))
+
+
+def format_clusters(groups):
+    """
+    {(row, col): [count, sum_lat, sum_lon]} -> cluster dicts ordered by block.
+    Centroids are rounded to 1e-6 deg (~0.1 m) so every store backend gives the same answer.
+    """
+    return [
+        {'lat': round(sum_lat / count, 6), 'lon': round(sum_lon / count, 6), 'count': count}
+        for _, (count, sum_lat, sum_lon) in sorted(groups.items())
+    ]
+
+
+class GridIndex:
+    """
+    Uniform lat/lon grid over point ids.
+    Each cell holds the ids inside it, so viewport and radius lookups only
+    touch the handful of cells they overlap instead of every stored point.
+    """
+
+    def __init__(self, cell_size_deg=0.01):
+        # 0.01 deg is roughly 1.1 km, about one map tile at street zoom
+        self.cell_size = cell_size_deg
+        self._cells = defaultdict(set)
+        self._points = {}
+        # cell -> [sum_lat, sum_lon] of its points, for cluster centroids without visiting points
+        self._sums = defaultdict(lambda: [0.0, 0.0])
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, item_id):
+        return item_id in self._points
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_size), math.floor(lon / self.cell_size))
+
+    def insert(self, item_id, lat, lon):
+        if item_id in self._points:
+            self.remove(item_id)
+        self._points[item_id] = (lat, lon)
+        cell = self._cell(lat, lon)
+        self._cells[cell].add(item_id)
+        sums = self._sums[cell]
+        sums[0] += lat
+        sums[1] += lon
+
+    def remove(self, item_id):
+        point = self._points.pop(item_id, None)
+        if point is None:
+            return
+        cell = self._cell(*point)
+        members = self._cells[cell]
+        members.discard(item_id)
+        if not members:
+            del self._cells[cell]
+            del self._sums[cell]
+        else:
+            sums = self._sums[cell]
+            sums[0] -= point[0]
+            sums[1] -= point[1]
+
+    def get(self, item_id):
+        return self._points.get(item_id)
+
+    def _cells_in_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        row_min, col_min = self._cell(min_lat, min_lon)
+        row_max, col_max = self._cell(max_lat, max_lon)
+        span = (row_max - row_min + 1) * (col_max - col_min + 1)
+        # Zoomed-out views cover more cells than are occupied; walk the occupied ones instead
+        if span > len(self._cells):
+            return [
+                members for (row, col), members in self._cells.items()
+                if row_min <= row <= row_max and col_min <= col <= col_max
+            ]
+        cells = []
+        for row in range(row_min, row_max + 1):
+            for col in range(col_min, col_max + 1):
+                members = self._cells.get((row, col))
+                if members:
+                    cells.append(members)
+        return cells
+
+    def query_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """Returns ids of points inside the bounding box."""
+        points = self._points
+        result = []
+        for members in self._cells_in_bbox(min_lat, min_lon, max_lat, max_lon):
+            for item_id in members:
+                lat, lon = points[item_id]
+                if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+                    result.append(item_id)
+        return result
+
+    def query_radius(self, lat, lon, radius_m):
+        """Returns (id, distance_m) pairs within radius_m, nearest first."""
+        points = self._points
+        result = []
+        for members in self._cells_in_bbox(*radius_to_bbox(lat, lon, radius_m)):
+            for item_id in members:
+                distance = haversine(lat, lon, *points[item_id])
+                if distance <= radius_m:
+                    result.append((item_id, distance))
+        result.sort(key=lambda pair: pair[1])
+        return result
+
+    def clusters(self, min_lat, min_lon, max_lat, max_lon, cell_size_deg):
+        """
+        Groups points in the bounding box into blocks of cluster_cell_size(cell_size_deg)
+        (whole index cells). Interior cells come from per-cell counts and coordinate sums,
+        so the cost follows the number of occupied cells; only cells on the bbox edge
+        check their points against it.
+        Returns dicts with the centroid 'lat'/'lon' and 'count' (see format_clusters).
+        """
+        factor = max(1, round(cell_size_deg / self.cell_size))
+        row_min, col_min = self._cell(min_lat, min_lon)
+        row_max, col_max = self._cell(max_lat, max_lon)
+        groups = defaultdict(lambda: [0, 0.0, 0.0])
+        for (row, col), members in self._cells.items():
+            if not (row_min <= row <= row_max and col_min <= col <= col_max):
+                continue
+            group = groups[(row // factor, col // factor)]
+            if row in (row_min, row_max) or col in (col_min, col_max):
+                for item_id in members:
+                    lat, lon = self._points[item_id]
+                    if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+                        group[0] += 1
+                        group[1] += lat
+                        group[2] += lon
+            else:
+                sums = self._sums[(row, col)]
+                group[0] += len(members)
+                group[1] += sums[0]
+                group[2] += sums[1]
+        return format_clusters({key: group for key, group in groups.items() if group[0]})
@@ -5,7 +5,6 @@ import 'leaflet/dist/leaflet.css';
 const API_BASE_URL = 'http://127.0.0.1:5003';
 const START_LOCATION = [19.093344596650404, 73.01000000000000];
 const MAP_ZOOM = 15;
-const POLLING_INTERVAL_MS = 3000;
 
 const vehicleIcon = L.icon({
     iconUrl: 'https://cdn-icons-png.flaticon.com/64/3202/3202926.png', 
@@ -23,12 +22,22 @@ const LiveVehicleMap = () => {
     const issueMarkersRef = useRef({});
     const [lastUpdated, setLastUpdated] = useState(null);
     const [issues, setIssues] = useState([]);
-    const [skipNextFetch, setSkipNextFetch] = useState(false); // <--- flag to prevent poll overwrite
 
-    // Fetch issues from server
+    // Fetch issues inside the visible map area from server
     const fetchAllIssues = async () => {
         try {
-            const response = await fetch(`${API_BASE_URL}/get_issues`);
+            let url = `${API_BASE_URL}/get_issues`;
+            if (mapRef.current) {
+                const bounds = mapRef.current.getBounds();
+                const params = new URLSearchParams({
+                    min_lat: bounds.getSouth(),
+                    min_lon: bounds.getWest(),
+                    max_lat: bounds.getNorth(),
+                    max_lon: bounds.getEast()
+                });
+                url = `${API_BASE_URL}/get_issues_in_area?${params}`;
+            }
+            const response = await fetch(url);
             const serverIssues = await response.json();
             setIssues(serverIssues);
         } catch (error) {
@@ -41,7 +50,6 @@ const LiveVehicleMap = () => {
         try {
             await fetch(`${API_BASE_URL}/clear_issues`, { method: 'POST' });
             setIssues([]); // immediately update UI
-            setSkipNextFetch(true); // skip next poll to avoid snapping back
         } catch (error) {
             console.error("Error clearing issues:", error);
         }
@@ -58,7 +66,6 @@ const LiveVehicleMap = () => {
 
             // Optimistic UI update
             setIssues(currentIssues => currentIssues.filter(issue => issue.id !== issueId));
-            setSkipNextFetch(true); // skip next poll temporarily
 
             // Call backend to resolve
             await fetch(`${API_BASE_URL}/resolve_issue`, {
@@ -73,7 +80,7 @@ const LiveVehicleMap = () => {
         }
     };
 
-    // Initialize map and vehicle polling
+    // Initialize map and live event stream
     useEffect(() => {
         if (!mapRef.current) {
             const map = L.map('live-map').setView(START_LOCATION, MAP_ZOOM);
@@ -81,40 +88,54 @@ const LiveVehicleMap = () => {
                 attribution: '&copy; OpenStreetMap contributors'
             }).addTo(map);
             mapRef.current = map;
+            map.on('moveend', fetchAllIssues); // refetch when the viewport changes
 
             vehicleMarkerRef.current = L.marker(START_LOCATION, { icon: vehicleIcon })
                 .addTo(map)
                 .bindPopup("<b>Municipal Vehicle MH01-AV1234</b>");
         }
 
-        const updateVehicleLocation = async () => {
-            try {
-                const response = await fetch(`${API_BASE_URL}/get_locations`);
-                const locations = await response.json();
-                const vehiclePos = locations["MH01-AV1234"];
-                if (vehiclePos && vehicleMarkerRef.current) {
-                    vehicleMarkerRef.current.setLatLng([vehiclePos.lat, vehiclePos.lon]);
-                    setLastUpdated(new Date());
-                }
-            } catch (error) {
-                console.error("Error fetching vehicle location:", error);
+        const moveVehicle = (vehiclePos) => {
+            if (vehiclePos && vehicleMarkerRef.current) {
+                vehicleMarkerRef.current.setLatLng([vehiclePos.lat, vehiclePos.lon]);
+                setLastUpdated(new Date());
             }
         };
 
         fetchAllIssues(); // Initial fetch
 
-        const intervalId = setInterval(() => {
-            updateVehicleLocation();
-
-            if (!skipNextFetch) {
-                fetchAllIssues();
-            } else {
-                setSkipNextFetch(false); // reset flag
-            }
-        }, POLLING_INTERVAL_MS);
+        // Server pushes vehicle pings and issue changes as they happen
+        const eventSource = new EventSource(`${API_BASE_URL}/stream`);
+        eventSource.addEventListener('ready', (event) => {
+            moveVehicle(JSON.parse(event.data).vehicles["MH01-AV1234"]);
+            fetchAllIssues(); // catch up on anything missed while disconnected
+        });
+        eventSource.addEventListener('resync', fetchAllIssues);
+        eventSource.addEventListener('vehicle_location', (event) => {
+            const ping = JSON.parse(event.data);
+            if (ping.vehicle_id === "MH01-AV1234") moveVehicle(ping);
+        });
+        eventSource.addEventListener('vehicle_locations', (event) => {
+            moveVehicle(JSON.parse(event.data).find(ping => ping.vehicle_id === "MH01-AV1234"));
+        });
+        eventSource.addEventListener('issue_created', (event) => {
+            const issue = JSON.parse(event.data);
+            if (!mapRef.current.getBounds().contains([issue.latitude, issue.longitude])) return;
+            setIssues(currentIssues => currentIssues.some(i => i.id === issue.id)
+                ? currentIssues
+                : [...currentIssues, issue]);
+        });
+        eventSource.addEventListener('issue_updated', (event) => {
+            const issue = JSON.parse(event.data); // e.g. a repeat report merged into an open issue
+            setIssues(currentIssues => currentIssues.map(i => (i.id === issue.id ? issue : i)));
+        });
+        eventSource.addEventListener('issue_resolved', (event) => {
+            const { id } = JSON.parse(event.data);
+            setIssues(currentIssues => currentIssues.filter(issue => issue.id !== id));
+        });
 
-        return () => clearInterval(intervalId);
-    }, [skipNextFetch]);
+        return () => eventSource.close();
+    }, []);
 
     // Sync map markers with issues state
     useEffect(() => {
@@ -1,39 +1,166 @@
-from fastapi import FastAPI
+import asyncio
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-import requests
-from PIL import Image
-import io
+import os
+import sys
+import httpx
 import torch
-import torch.nn as nn
-import torchvision.transforms as transforms
-from src.model import CNNClassifier
+from src.manifest import load_classes
+from src.runtime import artifact_path, load_predictor
+from src.batcher import MicroBatcher
+from src.preprocess import PREPROCESS_VERSION, preprocess
+from src.prediction_cache import PredictionCache, image_digest
 
-# ---------------------------------------------------------
-# FastAPI app
-# ---------------------------------------------------------
-app = FastAPI()
+# shared/ lives one level up, next to the other services
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from shared.observability import REGISTRY, get_logger, instrument_fastapi, stage_timer
+
+log = get_logger("classifier")
 
 # ---------------------------------------------------------
 # Device & Model Setup
 # ---------------------------------------------------------
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 MODEL_PATH = "models/best_model.pth"
-CLASS_NAMES = ["roads", "sanitation", "electricity", "water", "other"]
+# float | torchscript | int8 | onnx; run `python -m src.optimize` first for the exported ones
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "float")
+# Output order as training saw it (models/best_model.json, written by src/train.py)
+CLASS_NAMES = load_classes(MODEL_PATH)
+# Concurrent requests are classified together: a batch closes at this many
+# images or after this many milliseconds, whichever comes first
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 32))
+MAX_BATCH_WAIT_MS = float(os.environ.get("MAX_BATCH_WAIT_MS", 5))
+# Image downloads
+FETCH_TIMEOUT_SEC = float(os.environ.get("FETCH_TIMEOUT_SEC", 10))
+MAX_IMAGE_BYTES = int(os.environ.get("MAX_IMAGE_BYTES", 10 * 1024 * 1024))
+MAX_CONNECTIONS = int(os.environ.get("MAX_CONNECTIONS", 200))
+# /predict_batch: images per request, and how many of them are downloaded at once
+MAX_BATCH_ITEMS = int(os.environ.get("MAX_BATCH_ITEMS", 1000))
+BATCH_FETCH_CONCURRENCY = int(os.environ.get("BATCH_FETCH_CONCURRENCY", 32))
+# Prediction cache; set CACHE_PATH (e.g. data/prediction_cache.db) to keep it across restarts
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 10000))
+CACHE_TTL_SEC = float(os.environ.get("CACHE_TTL_SEC", 24 * 3600))
+CACHE_PATH = os.environ.get("CACHE_PATH")
 
 # Load trained CNN model
-model = CNNClassifier(num_classes=len(CLASS_NAMES))
-model.load_state_dict(torch.load(MODEL_PATH, map_location=DEVICE))
-model.to(DEVICE)
-model.eval()
+predict = load_predictor(MODEL_PATH, len(CLASS_NAMES), MODEL_BACKEND, DEVICE)
+
+# Cached predictions are tied to these exact weights, class names and preprocessing
+with open(artifact_path(MODEL_PATH, MODEL_BACKEND), "rb") as f:
+    MODEL_VERSION = hashlib.sha256(
+        f.read() + json.dumps([CLASS_NAMES, PREPROCESS_VERSION]).encode()
+    ).hexdigest()[:12]
+
+# ---------------------------------------------------------
+# Image Preprocessing
+# ---------------------------------------------------------
+# Decoding and resizing release the GIL, so they run on a pool instead of the event loop
+preprocess_pool = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="preprocess")
+
+# ---------------------------------------------------------
+# Image Fetching
+# ---------------------------------------------------------
+http_client = None  # shared httpx.AsyncClient, opened in lifespan
+
+async def fetch_image(url):
+    """Downloads an image, giving up after FETCH_TIMEOUT_SEC or once it passes MAX_IMAGE_BYTES."""
+    try:
+        async with http_client.stream("GET", url) as response:
+            response.raise_for_status()
+            declared = response.headers.get("content-length")
+            if declared and int(declared) > MAX_IMAGE_BYTES:
+                raise ValueError(f"Image is larger than {MAX_IMAGE_BYTES} bytes")
+            data = bytearray()
+            async for chunk in response.aiter_bytes():
+                data += chunk
+                if len(data) > MAX_IMAGE_BYTES:
+                    raise ValueError(f"Image is larger than {MAX_IMAGE_BYTES} bytes")
+    except httpx.TimeoutException:
+        raise ValueError(f"Timed out fetching image after {FETCH_TIMEOUT_SEC:g}s")
+    return bytes(data)
 
 # ---------------------------------------------------------
-# Image Transformations
+# Batched Inference
 # ---------------------------------------------------------
-transform = transforms.Compose([
-    transforms.Resize((64, 64)),
-    transforms.ToTensor(),
-    transforms.Normalize((0.5,), (0.5,))
-])
+def classify_batch(tensors):
+    """Runs one forward pass over a list of preprocessed images."""
+    BATCH_SIZE_HIST.observe(len(tensors))
+    with stage_timer("infer"):
+        probs = torch.softmax(predict(torch.stack(tensors)), dim=1)
+        conf, pred_idx = torch.max(probs, 1)
+    return [
+        (CLASS_NAMES[idx], round(c * 100, 2))
+        for c, idx in zip(conf.tolist(), pred_idx.tolist())
+    ]
+
+batcher = MicroBatcher(classify_batch, MAX_BATCH_SIZE, MAX_BATCH_WAIT_MS)
+cache = PredictionCache(CACHE_MAX_ENTRIES, CACHE_TTL_SEC, CACHE_PATH, namespace=MODEL_VERSION)
+# SQLite reads and commits happen on this thread, never on the event loop
+cache_io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-io")
+
+async def cache_call(method, *args):
+    """Calls a cache method, on cache_io when it may touch the disk."""
+    if not cache.persistent:
+        return method(*args)
+    return await asyncio.get_running_loop().run_in_executor(cache_io, method, *args)
+
+BATCH_SIZE_HIST = REGISTRY.histogram("classifier_batch_size", "Images per model forward pass",
+                                     buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+REGISTRY.gauge("prediction_cache_entries", "Entries in the in-memory prediction cache", lambda: len(cache))
+REGISTRY.counter_func("prediction_cache_hits_total", "Predictions served from the cache",
+                      lambda: cache.url_hits + cache.digest_hits)
+REGISTRY.counter_func("prediction_cache_misses_total", "Predictions that ran the model", lambda: cache.misses)
+
+async def classify_image_bytes(data, url=None):
+    """(predicted_class, confidence, cached) for raw image bytes, reusing earlier results for the same content."""
+    digest = image_digest(data)
+    cached = await cache_call(cache.get_digest, digest, url)
+    if cached is not None:
+        return cached + (True,)
+    with stage_timer("decode"):
+        img_tensor = await asyncio.get_running_loop().run_in_executor(preprocess_pool, preprocess, data)
+    # Inference, batched with any other requests in flight
+    result = await batcher.submit(img_tensor)
+    await cache_call(cache.put, digest, result, url)
+    return result + (False,)
+
+async def classify_url(image_url):
+    cached = await cache_call(cache.get_url, image_url)
+    if cached is not None:
+        return cached + (True,)
+    log.debug("Fetching image", extra={"url": image_url})
+    # Fetch and preprocess without blocking other requests
+    with stage_timer("fetch"):
+        data = await fetch_image(image_url)
+    return await classify_image_bytes(data, image_url)
+
+# ---------------------------------------------------------
+# FastAPI app
+# ---------------------------------------------------------
+@asynccontextmanager
+async def lifespan(app):
+    global http_client
+    # One pooled client for every request keeps connections to image hosts alive
+    http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(FETCH_TIMEOUT_SEC),
+        limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS // 4),
+        follow_redirects=True,
+    )
+    batcher.start()
+    yield
+    await batcher.stop()
+    await http_client.aclose()
+    cache_io.shutdown()
+    cache.close()
+
+app = FastAPI(lifespan=lifespan)
+# Request latency histograms per route, served at /metrics
+instrument_fastapi(app)
 
 # ---------------------------------------------------------
 # Request Body Schema
@@ -48,6 +175,13 @@ class UrlRequest(BaseModel):
 def root():
     return {"message": "Civic Issue Department Classifier API running 🚀"}
 
+# ---------------------------------------------------------
+# Prediction Cache Stats
+# ---------------------------------------------------------
+@app.get("/cache_stats")
+def cache_stats():
+    return cache.stats()
+
 # ---------------------------------------------------------
 # Predict from URL
 # ---------------------------------------------------------
@@ -56,30 +190,79 @@ async def predict_url(req: UrlRequest):
     try:
         # Clean URL
         image_url = req.image_url.strip()
-        print("Fetching:", image_url)
-
-        # Fetch image
-        response = requests.get(image_url)
-        response.raise_for_status()
-
-        # Load image
-        image = Image.open(io.BytesIO(response.content)).convert("RGB")
-        img_tensor = transform(image).unsqueeze(0).to(DEVICE)
-
-        # Inference
-        with torch.no_grad():
-            outputs = model(img_tensor)
-            probs = nn.Softmax(dim=1)(outputs)
-            conf, pred_idx = torch.max(probs, 1)
-
-        predicted_class = CLASS_NAMES[pred_idx.item()]
-        confidence = round(conf.item() * 100, 2)
+        predicted_class, confidence, is_cached = await classify_url(image_url)
 
         return {
             "predicted_class": predicted_class,
             "confidence": confidence,
-            "source_url": image_url
+            "source_url": image_url,
+            "cached": is_cached
         }
 
     except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+# ---------------------------------------------------------
+# Batch Prediction
+# ---------------------------------------------------------
+async def _predict_batch_item(index, semaphore, url=None, data=None, filename=None):
+    try:
+        async with semaphore:
+            if url is not None:
+                predicted_class, confidence, is_cached = await classify_url(url)
+            else:
+                if len(data) > MAX_IMAGE_BYTES:
+                    raise ValueError(f"Image is larger than {MAX_IMAGE_BYTES} bytes")
+                predicted_class, confidence, is_cached = await classify_image_bytes(data)
+        result = {"predicted_class": predicted_class, "confidence": confidence, "cached": is_cached}
+    except Exception as e:
+        result = {"error": str(e)}
+    result["index"] = index
+    if url is not None:
+        result["source_url"] = url
+    else:
+        result["filename"] = filename
+    return result
+
+@app.post("/predict_batch")
+async def predict_batch(request: Request):
+    """
+    Classifies many images in one call: a JSON body {"image_urls": [...]} or a
+    multipart form with one or more "files". Images are fetched concurrently and
+    share model batches with each other; one NDJSON line is streamed back per
+    image as soon as it is classified, tagged with its position in the request.
+    """
+    semaphore = asyncio.Semaphore(BATCH_FETCH_CONCURRENCY)
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        # Read uploads now: the form is closed before the streamed response finishes
+        items = [
+            {"data": await upload.read(), "filename": upload.filename}
+            for upload in form.getlist("files")
+        ]
+    else:
+        try:
+            body = await request.json()
+            items = [{"url": url.strip()} for url in body["image_urls"]]
+        except Exception:
+            return JSONResponse({"error": "Send {\"image_urls\": [...]} or multipart files."}, status_code=400)
+    if not items:
+        return JSONResponse({"error": "No images given."}, status_code=400)
+    if len(items) > MAX_BATCH_ITEMS:
+        return JSONResponse({"error": f"At most {MAX_BATCH_ITEMS} images per request."}, status_code=400)
+
+    tasks = [
+        asyncio.create_task(_predict_batch_item(index, semaphore, **item))
+        for index, item in enumerate(items)
+    ]
+
+    async def results():
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            # Client went away: stop fetching the rest
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
@@ -0,0 +1,273 @@
+# src/benchmark.py
+"""
+Serving benchmarks for the department classifier, runnable offline.
+
+    python -m src.benchmark --output bench.json
+    python -m src.benchmark --sections e2e --requests 2000 --concurrency 64
+    python -m src.benchmark --sections e2e --url http://127.0.0.1:8000   # an already running app
+
+Sections:
+  model       forward-pass latency per backend (float + any exports found) and batch size
+  preprocess  decode + resize + normalize cost per source image size, fast path vs torchvision
+  e2e         /predict_url throughput and p50/p95/p99 under concurrent load; images come
+              from a local HTTP stub, and the app is started with uvicorn unless --url is given.
+              Runs once with unique images (cold) and once repeating them (warm, cache hits).
+
+Results are printed, and written as JSON with --output so runs can be compared over time.
+"""
+import argparse
+import asyncio
+import http.server
+import io
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+from src.manifest import load_classes
+from src.preprocess import preprocess
+from src.runtime import BACKENDS, artifact_path, load_predictor
+
+MODEL_PATH = "models/best_model.pth"
+BATCH_SIZES = [1, 8, 32, 64]
+IMAGE_SIZES = [(640, 480), (1920, 1080), (4000, 3000)]
+
+
+def percentiles(samples_ms):
+    samples = np.asarray(samples_ms)
+    return {f"p{p}_ms": round(float(np.percentile(samples, p)), 3) for p in (50, 95, 99)}
+
+
+def synthetic_jpeg(width, height, seed=0):
+    """A photo-like JPEG (smooth gradients plus noise) with distinct content per seed."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([x / width, y / height, (x + y) / (width + height)], axis=2) * 200
+    base += rng.integers(0, 56, size=3)
+    noise = rng.normal(0, 12, size=(height // 8 + 1, width // 8 + 1, 3)).repeat(8, 0).repeat(8, 1)
+    pixels = np.clip(base + noise[:height, :width], 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+# ---------------------------------------------------------
+# Model
+# ---------------------------------------------------------
+def bench_model(model_path, batch_sizes, iterations=30):
+    results = []
+    for backend in BACKENDS:
+        if not os.path.exists(artifact_path(model_path, backend)):
+            continue
+        try:
+            predict = load_predictor(model_path, len(load_classes(model_path)), backend)
+        except ImportError as e:
+            print(f"Skipping {backend}: {e}")
+            continue
+        for batch_size in batch_sizes:
+            batch = torch.randn(batch_size, 3, 64, 64)
+            for _ in range(3):
+                predict(batch)
+            timings = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                predict(batch)
+                timings.append((time.perf_counter() - start) * 1000)
+            row = {"backend": backend, "batch_size": batch_size, **percentiles(timings)}
+            row["ms_per_image"] = round(row["p50_ms"] / batch_size, 3)
+            row["images_per_sec"] = round(1000 / row["ms_per_image"], 1)
+            results.append(row)
+            print(f"model {backend:<12} batch {batch_size:>3}: {row['p50_ms']:8.2f} ms/batch "
+                  f"{row['ms_per_image']:7.3f} ms/img")
+    return results
+
+
+# ---------------------------------------------------------
+# Preprocessing
+# ---------------------------------------------------------
+def bench_preprocess(image_sizes, iterations=10):
+    from torchvision import transforms
+    reference = transforms.Compose([
+        transforms.Resize((64, 64)),
+        transforms.ToTensor()
+    ])
+    paths = {
+        "fast": preprocess,
+        "torchvision": lambda data: reference(Image.open(io.BytesIO(data)).convert("RGB")),
+    }
+    results = []
+    for width, height in image_sizes:
+        data = synthetic_jpeg(width, height)
+        for name, run in paths.items():
+            run(data)
+            timings = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                run(data)
+                timings.append((time.perf_counter() - start) * 1000)
+            row = {"path": name, "width": width, "height": height, "jpeg_kb": round(len(data) / 1024, 1),
+                   **percentiles(timings)}
+            results.append(row)
+            print(f"preprocess {name:<11} {width}x{height}: {row['p50_ms']:8.2f} ms/img")
+    return results
+
+
+# ---------------------------------------------------------
+# End to end
+# ---------------------------------------------------------
+def start_image_stub(images):
+    """Serves images[i] at /<i>.jpg from a background thread; returns (server, base_url)."""
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            try:
+                body = images[int(self.path.strip("/").split(".")[0])]
+            except (ValueError, IndexError):
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def start_app(port, env):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        # The app logs JSON lines to stderr; keep only warnings and errors so they don't
+        # interleave with the results but startup failures still show
+        env={**os.environ, "LOG_LEVEL": "WARNING", **env},
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    import httpx
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("app exited during startup")
+        try:
+            if httpx.get(url + "/", timeout=1).status_code == 200:
+                return process, url
+        except httpx.TransportError:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("app did not start within 120s")
+
+
+async def load_test(app_url, image_urls, concurrency):
+    import httpx
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(client, image_url):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post(app_url + "/predict_url", json={"image_url": image_url})
+                failed = response.status_code != 200 or "error" in response.json()
+            except httpx.HTTPError:
+                failed = True
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += failed
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(client, image_url) for image_url in image_urls))
+        elapsed = time.perf_counter() - start
+    return {
+        "requests": len(image_urls),
+        "concurrency": concurrency,
+        "errors": errors,
+        "requests_per_sec": round(len(image_urls) / elapsed, 1),
+        **percentiles(latencies),
+    }
+
+
+def bench_e2e(requests, concurrency, image_size, app_url=None, backend="float"):
+    print(f"Generating {requests} test images at {image_size[0]}x{image_size[1]}...")
+    images = [synthetic_jpeg(*image_size, seed=i) for i in range(requests)]
+    stub, stub_url = start_image_stub(images)
+    process = None
+    try:
+        if app_url is None:
+            with socket.socket() as s:
+                s.bind(("127.0.0.1", 0))
+                port = s.getsockname()[1]
+            # No CACHE_PATH: every run starts with an empty in-memory cache
+            process, app_url = start_app(port, {"MODEL_BACKEND": backend, "CACHE_PATH": ""})
+        image_urls = [f"{stub_url}/{i}.jpg" for i in range(requests)]
+        results = {"image_width": image_size[0], "image_height": image_size[1]}
+        for phase in ("cold", "warm"):
+            results[phase] = asyncio.run(load_test(app_url, image_urls, concurrency))
+            row = results[phase]
+            print(f"e2e {phase}: {row['requests_per_sec']} req/s, p50 {row['p50_ms']} ms, "
+                  f"p95 {row['p95_ms']} ms, p99 {row['p99_ms']} ms, {row['errors']} errors")
+        return results
+    finally:
+        stub.shutdown()
+        if process:
+            process.terminate()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the department classifier service.")
+    parser.add_argument("--sections", nargs="+", choices=["model", "preprocess", "e2e"],
+                        default=["model", "preprocess", "e2e"])
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=BATCH_SIZES)
+    parser.add_argument("--requests", type=int, default=500, help="e2e requests per phase")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--image-size", type=int, nargs=2, default=[1280, 960], metavar=("W", "H"),
+                        help="size of the e2e test images")
+    parser.add_argument("--backend", choices=BACKENDS, default="float", help="MODEL_BACKEND for the e2e app")
+    parser.add_argument("--url", help="benchmark this running app instead of starting one")
+    parser.add_argument("--output", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "torch_threads": torch.get_num_threads(),
+            "cpu_count": os.cpu_count(),
+            "machine": platform.machine(),
+        },
+    }
+    if "model" in args.sections:
+        report["model"] = bench_model(args.model, args.batch_sizes)
+    if "preprocess" in args.sections:
+        report["preprocess"] = bench_preprocess(IMAGE_SIZES)
+    if "e2e" in args.sections:
+        report["e2e"] = bench_e2e(args.requests, args.concurrency, tuple(args.image_size), args.url, args.backend)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,147 @@
+import hashlib
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import torch
-from torchvision import datasets, transforms
-from torch.utils.data import DataLoader
+import torch.nn.functional as F
+from PIL import Image
+from torchvision import datasets
+from torch.utils.data import BatchSampler, DataLoader, Dataset, RandomSampler, SequentialSampler
+
+IMAGE_SIZE = 64
+
+
+# ---------------------------------------------------------
+# Decoded image cache
+# ---------------------------------------------------------
+def _decode(path, size=IMAGE_SIZE):
+    image = Image.open(path)
+    if image.format == "JPEG":
+        # libjpeg can decode at 1/2, 1/4 or 1/8 scale; keep at least 4x the target size
+        image.draft("RGB", (size * 4, size * 4))
+    # Same resize as transforms.Resize((64, 64)) on a PIL image
+    return np.asarray(image.convert("RGB").resize((size, size), Image.BILINEAR))
+
+
+def _signature(samples):
+    """Changes whenever an image is added, removed or rewritten."""
+    digest = hashlib.sha256()
+    for path, label in samples:
+        stat = os.stat(path)
+        digest.update(f"{path}|{label}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def build_cache(split_dir, cache_dir, size=IMAGE_SIZE, workers=None):
+    """
+    Decodes every image in an ImageFolder tree once into cache_dir/images.npy, a
+    (N, size, size, 3) uint8 array read back with mmap, plus labels.npy and
+    meta.json. Returns the class names. Skips the work if the cache is current.
+    """
+    folder = datasets.ImageFolder(split_dir)
+    signature = _signature(folder.samples)
+    meta_path = os.path.join(cache_dir, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta["signature"] == signature and meta["size"] == size:
+            return meta["classes"]
+
+    os.makedirs(cache_dir, exist_ok=True)
+    print(f"Caching {len(folder.samples)} images from {split_dir} at {size}x{size}...")
+    images = np.lib.format.open_memmap(
+        os.path.join(cache_dir, "images.npy"), mode="w+", dtype=np.uint8,
+        shape=(len(folder.samples), size, size, 3)
+    )
+    paths = [path for path, _ in folder.samples]
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for i, pixels in enumerate(pool.map(lambda path: _decode(path, size), paths)):
+            images[i] = pixels
+    images.flush()
+    del images
+    np.save(os.path.join(cache_dir, "labels.npy"), np.array(folder.targets, dtype=np.int64))
+    # meta.json last: a half-written cache never looks current
+    with open(meta_path, "w") as f:
+        json.dump({"signature": signature, "size": size, "classes": folder.classes}, f)
+    return folder.classes
+
+
+# ---------------------------------------------------------
+# Batched augmentation
+# ---------------------------------------------------------
+def augment_batch(images, max_degrees=10):
+    """
+    RandomHorizontalFlip + RandomRotation(10) for a whole (N, 3, H, W) batch at
+    once: one flip mask and one affine grid instead of N PIL operations.
+    """
+    flip = torch.rand(images.shape[0]) < 0.5
+    images = torch.where(flip[:, None, None, None], images.flip(3), images)
+    angles = (torch.rand(images.shape[0]) * 2 - 1) * math.radians(max_degrees)
+    cos, sin = torch.cos(angles), torch.sin(angles)
+    zeros = torch.zeros_like(angles)
+    theta = torch.stack([torch.stack([cos, -sin, zeros], 1), torch.stack([sin, cos, zeros], 1)], 1)
+    grid = F.affine_grid(theta, images.shape, align_corners=False)
+    # nearest + zero fill, as torchvision's RandomRotation defaults
+    return F.grid_sample(images, grid, mode="nearest", padding_mode="zeros", align_corners=False)
+
+
+class CachedImageDataset(Dataset):
+    """
+    Serves whole batches from a build_cache() directory. Indexed with a list of
+    indices (use with a BatchSampler), returns (N, 3, H, W) floats in [0, 1] and
+    labels, matching ToTensor() on the resized image.
+    """
+
+    def __init__(self, cache_dir, augment=False):
+        self.cache_dir = cache_dir
+        self.augment = augment
+        self.labels = torch.from_numpy(np.load(os.path.join(cache_dir, "labels.npy")))
+        self._images = None  # opened lazily so each worker maps the file itself
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, indices):
+        if self._images is None:
+            self._images = np.load(os.path.join(self.cache_dir, "images.npy"), mmap_mode="r")
+        indices = np.asarray(indices)
+        images = torch.from_numpy(np.ascontiguousarray(self._images[indices]))
+        images = images.permute(0, 3, 1, 2).float().div_(255)
+        if self.augment:
+            images = augment_batch(images)
+        return images, self.labels[indices]
+
+
+def _loader(dataset, batch_size, shuffle, num_workers):
+    sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+    return DataLoader(
+        dataset,
+        sampler=BatchSampler(sampler, batch_size, drop_last=False),
+        batch_size=None,  # the dataset already returns whole batches
+        num_workers=num_workers,
+        pin_memory=torch.cuda.is_available(),
+        persistent_workers=num_workers > 0,
+    )
 
-def get_dataloaders(data_dir="data/dataset", batch_size=4):
-    train_transform = transforms.Compose([
-        transforms.Resize((64, 64)),
-        transforms.RandomHorizontalFlip(),
-        transforms.RandomRotation(10),
-        transforms.ToTensor()
-    ])
 
-    val_transform = transforms.Compose([
-        transforms.Resize((64, 64)),
-        transforms.ToTensor()
-    ])
+def get_dataloaders(data_dir="data/dataset", batch_size=4, num_workers=None, cache_dir=None):
+    """
+    Train/val loaders over a decoded 64x64 cache of data_dir (built on first use,
+    rebuilt when the images change), so epochs read memory-mapped pixels instead
+    of decoding JPEGs. cache_dir defaults to a 'cache' folder next to data_dir.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.normpath(data_dir)), "cache")
+    if num_workers is None:
+        num_workers = min(4, os.cpu_count() or 1)
 
-    train_data = datasets.ImageFolder(f"{data_dir}/train", transform=train_transform)
-    val_data = datasets.ImageFolder(f"{data_dir}/val", transform=val_transform)
+    classes = build_cache(f"{data_dir}/train", f"{cache_dir}/train")
+    build_cache(f"{data_dir}/val", f"{cache_dir}/val")
 
-    train_loader = DataLoader(train_data, batch_size=batch_size, shuffle=True)
-    val_loader = DataLoader(val_data, batch_size=batch_size, shuffle=False)
+    train_loader = _loader(CachedImageDataset(f"{cache_dir}/train", augment=True), batch_size, True, num_workers)
+    val_loader = _loader(CachedImageDataset(f"{cache_dir}/val"), batch_size, False, num_workers)
 
-    return train_loader, val_loader, train_data.classes
\ No newline at end of file
+    return train_loader, val_loader, classes
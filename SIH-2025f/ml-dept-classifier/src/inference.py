@@ -1,48 +1,155 @@
-import torch
-import torch.nn as nn
-from torchvision import transforms
-from PIL import Image
-import sys
+"""
+Classify images from the command line.
+
+    python -m src.inference path/to/image.jpg
+    python -m src.inference path/to/folder --workers 4 --output predictions.csv
+
+Only the model and its manifest (models/best_model.json, written by train.py)
+are loaded, on first use; the dataset is never scanned.
+"""
+import argparse
+import csv
 import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-from src.model import CNNClassifier
-from src.dataloader import get_dataloaders
+import torch
+
+from src.manifest import load_classes
+from src.preprocess import preprocess, preprocess_batch
+from src.runtime import BACKENDS, load_predictor
+
+MODEL_PATH = "models/best_model.pth"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-_, _, classes = get_dataloaders("data/dataset", batch_size=1)
+_predict = None
+_classes = None
+
+
+def get_model(model_path=MODEL_PATH, backend="float"):
+    """Loads the predictor and class names once, on first call."""
+    global _predict, _classes
+    if _predict is None:
+        _classes = load_classes(model_path)
+        _predict = load_predictor(model_path, len(_classes), backend, device)
+    return _predict, _classes
+
 
-model = CNNClassifier(num_classes=len(classes)).to(device)
-model.load_state_dict(torch.load("models/best_model.pth", map_location=device))
-model.eval()
+def classify(batch):
+    """(class name, confidence %) for each image in an (N, 3, 64, 64) batch."""
+    predict, classes = get_model()
+    probs = torch.softmax(predict(batch), dim=1)
+    conf, pred_idx = torch.max(probs, 1)
+    return [(classes[idx], round(c * 100, 2)) for c, idx in zip(conf.tolist(), pred_idx.tolist())]
 
-transform = transforms.Compose([
-    transforms.Resize((64, 64)),  # must match training size
-    transforms.ToTensor(),
-    transforms.Normalize((0.5,), (0.5,))  # same as dataloader
-])
 
 def predict_image(image_path):
-    image = Image.open(image_path).convert("RGB")
-    image = transform(image).unsqueeze(0).to(device)
+    return classify(preprocess(image_path).unsqueeze(0))[0][0]
 
-    with torch.no_grad():
-        outputs = model(image)
-        _, predicted = torch.max(outputs, 1)
-        predicted_class = classes[predicted.item()]
 
-    return predicted_class
+# ---------------------------------------------------------
+# Directory mode
+# ---------------------------------------------------------
+def find_images(path):
+    return sorted(
+        os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def _load_chunk(paths):
+    """Preprocesses a chunk of images; returns (batch, paths that loaded, {path: error})."""
+    try:
+        return preprocess_batch(paths), paths, {}
+    except Exception:
+        tensors, loaded, errors = [], [], {}
+        for path in paths:
+            try:
+                tensors.append(preprocess(path))
+                loaded.append(path)
+            except Exception as e:
+                errors[path] = str(e)
+        return (torch.stack(tensors) if tensors else None), loaded, errors
+
+
+def classify_directory(image_dir, batch_size=32, workers=None):
+    """
+    Yields (path, predicted_class, confidence, error) for every image under image_dir.
+    Decoding runs on `workers` threads a few batches ahead of the model.
+    """
+    paths = find_images(image_dir)
+    chunks = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+    workers = workers or os.cpu_count()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        next_chunk = 0
+        while pending or next_chunk < len(chunks):
+            # Keep a bounded number of decoded batches in flight
+            while next_chunk < len(chunks) and len(pending) < workers * 2:
+                pending.append(pool.submit(_load_chunk, chunks[next_chunk]))
+                next_chunk += 1
+            batch, loaded, errors = pending.popleft().result()
+            if batch is not None:
+                for path, (predicted_class, confidence) in zip(loaded, classify(batch)):
+                    yield path, predicted_class, confidence, None
+            for path, error in errors.items():
+                yield path, None, None, error
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python src/inference.py <image_path>")
-        sys.exit(1)
 
-    image_path = sys.argv[1]
+def run_directory(image_dir, batch_size, workers, output):
+    total = len(find_images(image_dir))
+    if not total:
+        print(f"No images found in {image_dir}")
+        return
+    get_model()
+    writer = None
+    if output:
+        out_file = open(output, "w", newline="")
+        writer = csv.writer(out_file)
+        writer.writerow(["path", "predicted_class", "confidence", "error"])
+
+    start = time.time()
+    failed = 0
+    for done, (path, predicted_class, confidence, error) in enumerate(
+            classify_directory(image_dir, batch_size, workers), start=1):
+        if error:
+            failed += 1
+        if writer:
+            writer.writerow([path, predicted_class, confidence, error])
+        else:
+            print(f"{path}\t{predicted_class or 'ERROR: ' + error}\t{'' if confidence is None else confidence}")
+        if done % batch_size == 0 or done == total:
+            rate = done / max(time.time() - start, 1e-9)
+            print(f"\r{done}/{total} images, {rate:.1f} img/s", end="", file=sys.stderr, flush=True)
+
+    elapsed = max(time.time() - start, 1e-9)
+    print(f"\nClassified {total - failed} images in {elapsed:.1f}s ({total / elapsed:.1f} img/s), "
+          f"{failed} could not be read.", file=sys.stderr)
+    if writer:
+        out_file.close()
+        print(f"Wrote {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classify an image, or every image under a directory.")
+    parser.add_argument("path")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=None, help="decoding threads (default: all cores)")
+    parser.add_argument("--backend", choices=BACKENDS, default="float",
+                        help="exported model to use (see python -m src.optimize)")
+    parser.add_argument("--output", help="write results to this CSV instead of stdout")
+    args = parser.parse_args()
 
-    if not os.path.exists(image_path):
-        print(f"Error: {image_path} does not exist")
+    if not os.path.exists(args.path):
+        print(f"Error: {args.path} does not exist")
         sys.exit(1)
 
-    pred_class = predict_image(image_path)
-    print(f"Predicted class: {pred_class}")
\ No newline at end of file
+    get_model(backend=args.backend)
+    if os.path.isdir(args.path):
+        run_directory(args.path, args.batch_size, args.workers, args.output)
+    else:
+        print(f"Predicted class: {predict_image(args.path)}")
@@ -0,0 +1,28 @@
+# src/manifest.py
+import json
+import os
+
+
+def manifest_path(model_path):
+    """models/best_model.pth -> models/best_model.json"""
+    return os.path.splitext(model_path)[0] + ".json"
+
+
+def save_manifest(model_path, classes, image_size=64):
+    """Records what a checkpoint was trained on, so inference doesn't have to rescan the dataset."""
+    with open(manifest_path(model_path), "w") as f:
+        json.dump({"architecture": "CNNClassifier", "classes": list(classes), "image_size": image_size}, f, indent=2)
+
+
+def load_manifest(model_path):
+    with open(manifest_path(model_path)) as f:
+        return json.load(f)
+
+
+def load_classes(model_path, train_dir="data/dataset/train"):
+    """Class names in the model's output order, from its manifest."""
+    try:
+        return load_manifest(model_path)["classes"]
+    except FileNotFoundError:
+        # Older checkpoints have no manifest; ImageFolder's classes are the sorted folder names
+        return sorted(entry.name for entry in os.scandir(train_dir) if entry.is_dir())
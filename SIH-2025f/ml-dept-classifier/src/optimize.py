@@ -0,0 +1,120 @@
+# src/optimize.py
+"""
+Exports the trained classifier for CPU serving and checks the exports.
+
+    python -m src.optimize                       # all backends
+    python -m src.optimize --backends int8 onnx
+
+Writes each export next to models/best_model.pth, compares its predictions with
+the float model on the validation images (or random inputs if there are none)
+and prints per-image latency at a few batch sizes. Serve one with
+MODEL_BACKEND=<backend> uvicorn app:app.
+"""
+import argparse
+import os
+import time
+
+import torch
+import torch.nn as nn
+from torchvision import datasets, transforms
+
+from src.manifest import load_classes
+from src.runtime import artifact_path, load_float_model, load_predictor
+
+MODEL_PATH = "models/best_model.pth"
+VAL_DIR = "data/dataset/val"
+EXAMPLE_INPUT = torch.zeros(1, 3, 64, 64)
+
+transform = transforms.Compose([
+    transforms.Resize((64, 64)),
+    transforms.ToTensor()
+])
+
+
+# ---------------------------------------------------------
+# Exports
+# ---------------------------------------------------------
+def export_torchscript(model, path):
+    torch.jit.trace(model, EXAMPLE_INPUT).save(path)
+
+
+def export_int8(model, path):
+    # fc1 (16384 x 128) holds almost all of the weights; int8 Linear layers shrink it 4x
+    quantized = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    torch.jit.trace(quantized, EXAMPLE_INPUT).save(path)
+
+
+def export_onnx(model, path):
+    torch.onnx.export(
+        model, EXAMPLE_INPUT, path,
+        input_names=["input"], output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        dynamo=False,
+    )
+
+
+EXPORTERS = {"torchscript": export_torchscript, "int8": export_int8, "onnx": export_onnx}
+
+
+# ---------------------------------------------------------
+# Checks
+# ---------------------------------------------------------
+def parity_inputs(val_dir, count=256):
+    if os.path.isdir(val_dir):
+        images = [image for image, _ in datasets.ImageFolder(val_dir, transform=transform)]
+        if images:
+            return torch.stack(images)
+    print(f"No images in {val_dir}, checking parity on random inputs.")
+    return torch.randn(count, 3, 64, 64)
+
+
+def check_parity(reference, predict, inputs):
+    """Top-1 agreement with the float model and the largest softmax difference."""
+    expected = torch.softmax(reference(inputs), dim=1)
+    actual = torch.softmax(predict(inputs), dim=1)
+    agreement = (expected.argmax(1) == actual.argmax(1)).float().mean().item()
+    return agreement, (expected - actual).abs().max().item()
+
+
+def benchmark(predict, batch_size, iterations=50):
+    """Mean milliseconds per image at this batch size."""
+    batch = torch.randn(batch_size, 3, 64, 64)
+    for _ in range(5):
+        predict(batch)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        predict(batch)
+    return (time.perf_counter() - start) / iterations / batch_size * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export CNNClassifier for CPU serving and compare the exports.")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--backends", nargs="+", choices=list(EXPORTERS), default=list(EXPORTERS))
+    parser.add_argument("--val-dir", default=VAL_DIR)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    num_classes = len(load_classes(args.model))
+    model = load_float_model(args.model, num_classes)
+    for backend in args.backends:
+        path = artifact_path(args.model, backend)
+        EXPORTERS[backend](model, path)
+        print(f"Exported {backend} -> {path}")
+
+    reference = load_predictor(args.model, num_classes, "float")
+    inputs = parity_inputs(args.val_dir)
+    header = f"{'backend':<12} {'size MB':>8} {'top-1 agree':>12} {'max prob diff':>14}"
+    header += "".join(f" {'ms/img @' + str(bs):>11}" for bs in args.batch_sizes)
+    print(header)
+    for backend in ("float",) + tuple(args.backends):
+        predict = load_predictor(args.model, num_classes, backend)
+        agreement, max_diff = check_parity(reference, predict, inputs)
+        size_mb = os.path.getsize(artifact_path(args.model, backend)) / 1e6
+        row = f"{backend:<12} {size_mb:>8.2f} {agreement * 100:>11.1f}% {max_diff:>14.5f}"
+        row += "".join(f" {benchmark(predict, bs):>11.3f}" for bs in args.batch_sizes)
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
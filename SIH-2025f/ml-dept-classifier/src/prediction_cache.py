@@ -0,0 +1,158 @@
+# src/prediction_cache.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Expired and overflow rows are pruned from SQLite after this many writes
+PRUNE_EVERY = 1000
+
+
+def image_digest(data):
+    """Content key for downloaded or uploaded image bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class PredictionCache:
+    """
+    LRU + TTL cache of (predicted_class, confidence) results.
+
+    Each prediction is stored under the image URL and under the SHA-256 of the
+    image bytes, so the same photo uploaded under another URL is a hit too.
+    `namespace` (e.g. a hash of the model weights) keeps results from an older
+    model from being served. With `path`, entries are also written to SQLite
+    and survive restarts; memory stays the first place looked. The table is kept
+    to `max_disk_entries` rows (default 10x max_entries), expired rows first.
+    With `path` set, calls may touch the disk: run them off the event loop.
+    """
+
+    def __init__(self, max_entries=10000, ttl_sec=86400, path=None, namespace="", max_disk_entries=None):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries or max_entries * 10
+        self.ttl_sec = ttl_sec
+        self.namespace = namespace
+        self._writes = 0
+        self.url_hits = 0
+        self.digest_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (value, expires_at), oldest first
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "key TEXT PRIMARY KEY, predicted_class TEXT NOT NULL, "
+                "confidence REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS predictions_expiry ON predictions(expires_at)")
+            self._prune()
+
+    @property
+    def persistent(self):
+        return self._db is not None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _key(self, kind, value):
+        return f"{self.namespace}:{kind}:{value}"
+
+    # --- Lookups ---
+    def get_url(self, url):
+        value = self._get(self._key("url", url))
+        if value is not None:
+            self.url_hits += 1
+        return value
+
+    def get_digest(self, digest, url=None):
+        """Looks up by image content; on a hit, also remembers `url` for next time."""
+        value = self._get(self._key("sha256", digest))
+        if value is None:
+            self.misses += 1
+            return None
+        self.digest_hits += 1
+        if url:
+            self._put([self._key("url", url)], value)
+        return value
+
+    def put(self, digest, value, url=None):
+        keys = [self._key("sha256", digest)]
+        if url:
+            keys.append(self._key("url", url))
+        self._put(keys, value)
+
+    def stats(self):
+        lookups = self.url_hits + self.digest_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "url_hits": self.url_hits,
+            "digest_hits": self.digest_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.url_hits + self.digest_hits) / lookups, 4) if lookups else 0.0,
+            "persistent": self.persistent,
+        }
+
+    def close(self):
+        if self._db:
+            self._db.close()
+            self._db = None
+
+    # --- Storage ---
+    def _get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    return entry[0]
+                del self._entries[key]
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT predicted_class, confidence, expires_at FROM predictions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[2] <= now:
+                return None
+            value = (row[0], row[1])
+            self._remember(key, value, row[2])
+            return value
+
+    def _put(self, keys, value):
+        expires_at = time.time() + self.ttl_sec
+        with self._lock:
+            for key in keys:
+                self._remember(key, value, expires_at)
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)",
+                    [(key, value[0], value[1], expires_at) for key in keys]
+                )
+                self._db.commit()
+                self._writes += len(keys)
+                if self._writes >= PRUNE_EVERY:
+                    self._prune()
+
+    def _prune(self):
+        """Drops expired rows, then the soonest-expiring (oldest) rows beyond max_disk_entries."""
+        self._writes = 0
+        self._db.execute("DELETE FROM predictions WHERE expires_at < ?", (time.time(),))
+        excess = self._db.execute("SELECT COUNT(*) FROM predictions").fetchone()[0] - self.max_disk_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM predictions WHERE key IN "
+                "(SELECT key FROM predictions ORDER BY expires_at LIMIT ?)", (excess,)
+            )
+        self._db.commit()
+
+    def _remember(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
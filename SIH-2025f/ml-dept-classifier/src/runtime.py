@@ -0,0 +1,60 @@
+# src/runtime.py
+import os
+
+import torch
+
+from src.model import CNNClassifier
+
+# float: the trained state dict; torchscript: traced graph; int8: fc layers dynamically
+# quantized to int8, traced; onnx: ONNX Runtime session. Produce the exports with src/optimize.py.
+BACKENDS = ("float", "torchscript", "int8", "onnx")
+
+
+def artifact_path(model_path, backend):
+    """Where the export for `backend` lives, next to the trained weights."""
+    base = os.path.splitext(model_path)[0]
+    return {
+        "float": model_path,
+        "torchscript": base + ".ts.pt",
+        "int8": base + ".int8.pt",
+        "onnx": base + ".onnx",
+    }[backend]
+
+
+def load_float_model(model_path, num_classes, device="cpu"):
+    model = CNNClassifier(num_classes=num_classes)
+    model.load_state_dict(torch.load(model_path, map_location=device))
+    model.to(device)
+    model.eval()
+    return model
+
+
+def load_predictor(model_path, num_classes, backend="float", device="cpu"):
+    """
+    Returns predict(batch) -> logits for an (N, 3, 64, 64) float tensor.
+    Only the float backend uses `device`; the exported ones are CPU paths.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend {backend!r}, expected one of {BACKENDS}")
+    path = artifact_path(model_path, backend)
+
+    if backend == "onnx":
+        import onnxruntime
+        session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+        input_name = session.get_inputs()[0].name
+
+        def predict(batch):
+            return torch.from_numpy(session.run(None, {input_name: batch.cpu().numpy()})[0])
+        return predict
+
+    if backend == "float":
+        model = load_float_model(path, num_classes, device)
+    else:
+        model = torch.jit.load(path, map_location="cpu")
+        model.eval()
+        device = "cpu"
+
+    def predict(batch):
+        with torch.no_grad():
+            return model(batch.to(device))
+    return predict
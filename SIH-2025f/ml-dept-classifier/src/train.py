@@ -1,53 +1,196 @@
+"""
+Train the department classifier.
+
+    python src/train.py                           # train, keeping the best epoch by val accuracy
+    python src/train.py --benchmark-steps 200     # time N steps on synthetic data, no dataset needed
+
+Each epoch reports samples/sec, how a step splits between waiting for data and
+computing, and peak memory, so batch size, --threads and --channels-last can be
+compared directly.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from model import SimpleCNN
+from model import CNNClassifier
+from manifest import save_manifest
 from dataloader import get_dataloaders
 
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT, "data", "dataset")
+MODEL_PATH = os.path.join(ROOT, "models", "best_model.pth")
+
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-train_loader, val_loader, classes = get_dataloaders("data/dataset", batch_size=4)
-model = SimpleCNN(num_classes=len(classes)).to(device)
 
-criterion = nn.CrossEntropyLoss()
-optimizer = optim.Adam(model.parameters(), lr=0.001)
+def sync():
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+
+
+def peak_memory_mb():
+    """Peak GPU memory on CUDA, else the process's peak resident set size.
+
+    Returns None where the OS doesn't report it (the resource module is Unix-only).
+    """
+    if device.type == "cuda":
+        return torch.cuda.max_memory_allocated() / 2**20
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB on Linux
 
-epochs = 20
-for epoch in range(epochs):
+
+def format_memory(mb):
+    return "unavailable" if mb is None else f"{mb:.0f} MB"
+
+
+def to_device(images, labels, channels_last):
+    images = images.to(device, non_blocking=True)
+    if channels_last:
+        images = images.contiguous(memory_format=torch.channels_last)
+    return images, labels.to(device, non_blocking=True)
+
+
+def train_epoch(model, loader, criterion, optimizer, channels_last=False):
+    """One pass over loader. Returns loss, accuracy and timing for the epoch."""
     model.train()
-    running_loss, correct, total = 0.0, 0, 0
-    for images, labels in train_loader:
-        images, labels = images.to(device), labels.to(device)
-        optimizer.zero_grad()
+    # Running totals stay on the device; one .item() per epoch instead of per batch
+    loss_sum = torch.zeros((), device=device)
+    correct = torch.zeros((), device=device, dtype=torch.long)
+    total = 0
+    data_time = compute_time = 0.0
+
+    start = time.perf_counter()
+    step_end = start
+    for images, labels in loader:
+        images, labels = to_device(images, labels, channels_last)
+        compute_start = time.perf_counter()
+        data_time += compute_start - step_end
+
+        optimizer.zero_grad(set_to_none=True)
         outputs = model(images)
         loss = criterion(outputs, labels)
         loss.backward()
         optimizer.step()
 
-        running_loss += loss.item()
-        _, preds = torch.max(outputs, 1)
-        correct += (preds == labels).sum().item()
+        loss_sum += loss.detach()
+        correct += (outputs.argmax(1) == labels).sum()
         total += labels.size(0)
+        sync()
+        step_end = time.perf_counter()
+        compute_time += step_end - compute_start
 
-    print(f"Epoch [{epoch+1}/{epochs}] "
-          f"Train Loss: {running_loss/len(train_loader):.4f}, "
-          f"Train Acc: {100*correct/total:.2f}%")
+    steps = max(len(loader), 1)
+    return {
+        "loss": loss_sum.item() / steps,
+        "acc": 100 * correct.item() / max(total, 1),
+        "samples_per_sec": total / max(step_end - start, 1e-9),
+        "data_ms": 1000 * data_time / steps,
+        "compute_ms": 1000 * compute_time / steps,
+    }
 
-    # Validation
+
+def evaluate(model, loader, criterion, channels_last=False):
     model.eval()
-    val_loss, val_correct, val_total = 0.0, 0, 0
+    loss_sum = torch.zeros((), device=device)
+    correct = torch.zeros((), device=device, dtype=torch.long)
+    total = 0
     with torch.no_grad():
-        for images, labels in val_loader:
-            images, labels = images.to(device), labels.to(device)
+        for images, labels in loader:
+            images, labels = to_device(images, labels, channels_last)
             outputs = model(images)
-            loss = criterion(outputs, labels)
-            val_loss += loss.item()
-            _, preds = torch.max(outputs, 1)
-            val_correct += (preds == labels).sum().item()
-            val_total += labels.size(0)
-
-    print(f"Val Loss: {val_loss/len(val_loader):.4f}, "
-          f"Val Acc: {100*val_correct/val_total:.2f}%")
-import os
-os.makedirs("../models", exist_ok=True)  # ensures folder exists
-torch.save(model.state_dict(), "../models/best_model.pth")
\ No newline at end of file
+            loss_sum += criterion(outputs, labels)
+            correct += (outputs.argmax(1) == labels).sum()
+            total += labels.size(0)
+    return loss_sum.item() / max(len(loader), 1), 100 * correct.item() / max(total, 1)
+
+
+def train(args):
+    train_loader, val_loader, classes = get_dataloaders(args.data_dir, args.batch_size, args.num_workers)
+    model = CNNClassifier(num_classes=len(classes)).to(device)
+    if args.channels_last:
+        model = model.to(memory_format=torch.channels_last)
+
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(model.parameters(), lr=args.lr)
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)  # ensures folder exists
+
+    best_acc, best_epoch = -1.0, 0
+    for epoch in range(args.epochs):
+        stats = train_epoch(model, train_loader, criterion, optimizer, args.channels_last)
+        val_loss, val_acc = evaluate(model, val_loader, criterion, args.channels_last)
+        step_ms = stats["data_ms"] + stats["compute_ms"]
+
+        print(f"Epoch [{epoch+1}/{args.epochs}] "
+              f"Train Loss: {stats['loss']:.4f}, Train Acc: {stats['acc']:.2f}% | "
+              f"Val Loss: {val_loss:.4f}, Val Acc: {val_acc:.2f}%")
+        print(f"  {stats['samples_per_sec']:.1f} samples/s, step {step_ms:.1f} ms "
+              f"(data wait {stats['data_ms']:.1f} ms, compute {stats['compute_ms']:.1f} ms), "
+              f"peak memory {format_memory(peak_memory_mb())}")
+
+        if val_acc > best_acc:
+            best_acc, best_epoch = val_acc, epoch + 1
+            torch.save(model.state_dict(), args.output)
+            # Class order as ImageFolder saw it, read back by src/inference.py
+            save_manifest(args.output, classes)
+            print(f"  Saved best model (val acc {val_acc:.2f}%) to {args.output}")
+
+    print(f"Best epoch {best_epoch} with val acc {best_acc:.2f}%")
+
+
+def benchmark(args):
+    """Times training steps on random data: no disk, no augmentation, fixed seed."""
+    torch.manual_seed(args.seed)
+    model = CNNClassifier(num_classes=5).to(device)
+    if args.channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(model.parameters(), lr=args.lr)
+    images = torch.randn(args.batch_size, 3, 64, 64)
+    labels = torch.randint(0, 5, (args.batch_size,))
+    batches = [(images, labels)]
+
+    train_epoch(model, batches * 5, criterion, optimizer, args.channels_last)  # warm-up
+    stats = train_epoch(model, batches * args.benchmark_steps, criterion, optimizer, args.channels_last)
+    peak = peak_memory_mb()
+    print(json.dumps({
+        "device": device.type,
+        "batch_size": args.batch_size,
+        "threads": torch.get_num_threads(),
+        "channels_last": args.channels_last,
+        "steps": args.benchmark_steps,
+        "samples_per_sec": round(stats["samples_per_sec"], 1),
+        "step_ms": round(stats["data_ms"] + stats["compute_ms"], 3),
+        "peak_memory_mb": None if peak is None else round(peak, 1),
+    }))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train CNNClassifier on data/dataset.")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--output", default=MODEL_PATH)
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--lr", type=float, default=0.001)
+    parser.add_argument("--num-workers", type=int, default=None, help="data loader processes")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--channels-last", action="store_true", help="use NHWC memory format")
+    parser.add_argument("--benchmark-steps", type=int, default=0,
+                        help="time this many steps on synthetic data instead of training")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    if args.benchmark_steps:
+        benchmark(args)
+    else:
+        train(args)
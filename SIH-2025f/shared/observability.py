@@ -0,0 +1,283 @@
+# shared/observability.py
+"""
+Metrics and logging shared by the Python services.
+
+Metrics are kept in process and rendered in the Prometheus text format at
+/metrics; no client library is needed. Each service calls
+
+    from shared.observability import get_logger, instrument_flask, stage_timer
+    log = get_logger("backend")
+    instrument_flask(app)          # or instrument_fastapi(app)
+
+and wraps the expensive parts of a request in `with stage_timer("llm"):`.
+
+Logging goes through a queue to a background thread, so a log call on a hot
+path only enqueues a record. Lines are JSON with the level, service, message
+and any extra= fields; LOG_LEVEL sets the level (default INFO). Only the
+services' own loggers are routed this way; libraries such as httpx keep
+Python's default of printing warnings and errors only.
+"""
+import atexit
+import bisect
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; wide enough for both a 1 ms cache hit and a 30 s LLM call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+# ---------------------------------------------------------
+# Metrics
+# ---------------------------------------------------------
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_text(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels_text(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_labels_text(names, key + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_labels_text(names, key + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels_text(self.labels, key)} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{_labels_text(self.labels, key)} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """A value read at scrape time from `read()`, e.g. a queue length or cache size."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, read):
+        self.name, self.help, self.read = name, help_text, read
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", f"{self.name} {self.read()}"]
+
+
+class CounterFunc(Gauge):
+    """A count kept elsewhere that only goes up (e.g. cache hits), read at scrape time."""
+
+    kind = "counter"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _add(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name, help_text, read):
+        return self._add(Gauge(name, help_text, read))
+
+    def counter_func(self, name, help_text, read):
+        return self._add(CounterFunc(name, help_text, read))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time to produce a response, by route", ("method", "route", "status"))
+STAGE_SECONDS = REGISTRY.histogram(
+    "stage_duration_seconds", "Time spent in named steps of a request", ("stage",))
+STAGE_ERRORS = REGISTRY.counter(
+    "stage_errors_total", "Steps that raised an exception", ("stage",))
+
+
+@contextmanager
+def stage_timer(stage):
+    """Times the enclosed block as `stage` in stage_duration_seconds; works around awaits too."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+# ---------------------------------------------------------
+# Framework hooks
+# ---------------------------------------------------------
+def instrument_flask(app):
+    """Records every request in http_request_duration_seconds and serves GET /metrics."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g._request_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop("_request_start", None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - start,
+                                    method=request.method, route=route, status=response.status_code)
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+def instrument_fastapi(app):
+    """Records every request in http_request_duration_seconds and serves GET /metrics."""
+    from fastapi.responses import Response
+
+    @app.middleware("http")
+    async def _record_request(request, call_next):
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                                    route=route.path if route else "unmatched", status=status)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+# ---------------------------------------------------------
+# Logging
+# ---------------------------------------------------------
+# Attributes every LogRecord has; anything else on a record came from extra=
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "service"}
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, service):
+        super().__init__()
+        self.service = service
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "service": self.service,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_FIELDS)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+_listener = None
+_queue_handler = None
+
+
+def get_logger(service):
+    """
+    The service's logger, writing through a queue to a single thread that prints
+    JSON lines to stderr; the queue is flushed at exit. Child loggers
+    ("backend.store") inherit it; other loggers are left alone.
+    """
+    global _listener, _queue_handler
+    if _listener is None:
+        records = queue.Queue(maxsize=10000)
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter(service))
+        _listener = logging.handlers.QueueListener(records, handler, respect_handler_level=False)
+        _listener.start()
+        atexit.register(_listener.stop)
+        _queue_handler = _DroppingQueueHandler(records)
+    logger = logging.getLogger(service)
+    if _queue_handler not in logger.handlers:
+        logger.addHandler(_queue_handler)
+        logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+        logger.propagate = False
+    return logger
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: if the writer falls 10000 records behind, new records are dropped."""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+
+REGISTRY.counter_func("log_records_dropped_total", "Log records dropped because the writer fell behind",
+                      lambda: _DroppingQueueHandler.dropped)